@@ -1,14 +1,24 @@
 from asyncio import as_completed
 from app.scraper import scrape_pdf_links, stopProcessingScraper
-from urllib.error import URLError, HTTPError
-from http.client import RemoteDisconnected
+from app.scheduler import DownloadScheduler, savedContentLength, CHUNK_SIZE
+from app.httpclient import getSession
+from app.paths import planTargetPaths, sanitizeNames
+from app.workbook import companyLookupFormula, companyLookupFormulas, originalCompanyNames, savedFilePaths, sortCompaniesById, COMPANY_ID_COLUMN
+from app.search import indexWorkbook
+from app.profiling import profiledRun, profileDirectoryFor, stage, trackThread
+from app.validation import validatePDF, validationColumns, MAX_DOWNLOAD_ATTEMPTS
+from app.incremental import loadPreviousOutput, saveChangedCompanyandPDFs, readAddedURLs
+from app.cache import SingleFlightCache
+from app.urls import resourceKey, getRedirectCache
+from app.preflight import preflightURLs, describeWorkload
 import pandas as pd
 import requests
 import logging
 import concurrent.futures
+import contextlib
 import time
-import urllib.request
 import os
+import shutil
 from pathlib import Path
 import time
 import threading
@@ -19,28 +29,32 @@ from pathlib import Path
 
 
 stop_flag = False
+#Set by enableDownloadCache when several jobs share this process (see app.server)
+downloadCache = None
+#Excel automation attaches to the one running Excel instance, so jobs must not refresh at the same time
+excelLock = threading.Lock()
 
 
 
-def getTaURLs(xls):
+def readTASheets(xls):
     """
-    Takes an Excel file path containing TA URLs as input and returns the urls contained in the Excel as a list of lists.
-    
-    Each inner list corresponds to the URLs from a specific sheet in the Excel file.
+    Read every sheet of a TA URL Excel file.
 
     Parameters:
-    - xls (str): Path to the Excel file.
+    - xls (ExcelFile): The opened Excel file.
 
     Returns:
-    List[List[str]]: A list of lists, where each inner list contains URLs for the corresponding sheet.
+    - dict: Maps each sheet name to its DataFrame.
+
+    Raises:
+    - KeyError: If a sheet has no URL column.
     """
-    taUrls = []
     try:
-        for xls_sheet_name in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name = xls_sheet_name)
-            dfUrls = df['URL'].values.tolist()
-            taUrls.append(dfUrls)
-        return taUrls
+        sheets = {sheetName: pd.read_excel(xls, sheet_name = sheetName) for sheetName in xls.sheet_names}
+        for sheetName, df in sheets.items():
+            if 'URL' not in df.columns:
+                raise KeyError(f"No URL column in sheet {sheetName}")
+        return sheets
     except Exception as e:
         logging.exception(f"Error getting TA URLS: {e}")
         raise e
@@ -48,16 +62,17 @@ def getTaURLs(xls):
 
 
 
-def processURL(url, session, df): 
+@trackThread
+def processURL(url, session, sheets, companies, rowsOfSheet): 
     try:
-        urlIndex = df.index[df['URL'] == url][0]
         companyTuple = scrape_pdf_links(url, session)
-
+        status = "True" if companyTuple[0] is not None else str(companyTuple[1])
         if companyTuple[0] is not None:
-            df.at[urlIndex, 'Active'] = "True"
             companies.append(companyTuple[0])
-        else:
-            df.at[urlIndex, 'Active'] = str(companyTuple[1])
+
+        #Every row, on every sheet, that lists this page gets the same result
+        for sheetName, rows in rowsOfSheet.items():
+            sheets[sheetName].loc[rows, 'Active'] = status
         
         return True
     except Exception as e:
@@ -75,60 +90,76 @@ def updateExcel(df, xls, current_sheet):
         logging.warning(f"The file is open in another application")
         raise pe
     
-def processURLs(taUrls, xls, session, progress_callback):
+def processURLs(sheets, uniqueURLs, rowsOfURL, xlPath, session, progress_callback):
+    """
+    Scrape every unique URL of a TA URL file once and write the results to the Active column of every sheet.
+
+    Parameters:
+    - sheets (dict): Maps each sheet name to its DataFrame, as read by readTASheets.
+    - uniqueURLs (dict): The URL to fetch for each resource key, from preflightURLs.
+    - rowsOfURL (dict): The rows of each sheet that list each resource key, from preflightURLs.
+    - xlPath (Path): The TA URL file the sheets are written back to.
+    - session (requests.Session): The session to scrape with.
+
+    Returns:
+    - list: The scraped Company objects.
+    """
     start_time = time.time()
-    global companies
     companies = []
     completedScrapes = 0
 
-    for ind, sheetList in enumerate(taUrls):
-        current_sheet = xls.sheet_names[ind]
-        df = pd.read_excel(xls, sheet_name = current_sheet)
-        totalScrapes = len(sheetList)
-        
+    totalScrapes = len(uniqueURLs)
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {executor.submit(processURL, url, session, df): url for url in sheetList}
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = {executor.submit(processURL, url, session, sheets, companies, rowsOfURL[key]): url for key, url in uniqueURLs.items()}
 
-            for future in concurrent.futures.as_completed(futures):
-                if stop_flag:
-                    break
-                completedScrapes += 1
-                progress = (completedScrapes / totalScrapes) * 100
-                logging.info(f"Progress - {progress}%")
-                progress_callback(f"Loading...{progress}%", progress)
+        for future in concurrent.futures.as_completed(futures):
+            if stop_flag:
+                break
+            completedScrapes += 1
+            progress = (completedScrapes / totalScrapes) * 100
+            logging.info(f"Progress - {progress}%")
+            progress_callback(f"Loading...{progress}% of {totalScrapes} unique URLs", progress)
 
-            executor.shutdown(wait=True)  # This ensures that all threads finish before the program exits
+        executor.shutdown(wait=True)  # This ensures that all threads finish before the program exits
 
-            if not stop_flag:
-                updateExcel(df, xls, current_sheet)
+    if not stop_flag:
+        #Write all the sheets together, as writing them one at a time would keep only the last one
+        with pd.ExcelWriter(xlPath, engine='openpyxl') as writer:
+            for sheetName, df in sheets.items():
+                updateExcel(df, writer, sheetName)
     logging.info("--- %s seconds ---" % (time.time() - start_time))
     return companies
 
-def extractTAExcel(xlPath, progress_callback):
+def extractTAExcel(xlPath, progress_callback, failuresOnly = False):
     """
     Extract data from a TransAmerica Excel file.
 
-    This function takes the path to a TransAmerica Excel file as input, processes the contained
-    URLs concurrently, scrapes PDF links, and returns a list of Company objects representing
-    the processed companies. The function uses a requests.Session for making HTTP requests and
+    This function takes the path to a TransAmerica Excel file as input, checks and deduplicates the URLs of
+    every sheet, scrapes each unique URL concurrently, and returns a list of Company objects representing
+    the processed companies. The function uses the shared pooled session for making HTTP requests and
     ensures proper resource management by using context managers for both the session and Excel file.
 
     Parameters:
     - xlPath (str): Path to the TransAmerica Excel file.
+    - failuresOnly (bool, optional): Only scrape the rows whose Active column shows a fetch error.
 
     Returns:
     List[Company] or None: A list of Company objects if extraction is successful, or None in case of an error.
     """
 
     try:
-        session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections = 100, pool_maxsize = 100)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        with pd.ExcelFile(xlPath) as xls: 
-            taUrls = getTaURLs(xls)
-            companies = processURLs(taUrls, xls, session, progress_callback)
+        session = getSession()
+        with stage("readTASheets"):
+            with pd.ExcelFile(xlPath) as xls: 
+                sheets = readTASheets(xls)
+        #Stages cannot be nested, so the pre-flight check is its own stage before the scraping
+        with stage("preflight"):
+            uniqueURLs, rowsOfURL, report = preflightURLs(sheets, failuresOnly)
+        logging.info(describeWorkload(report))
+        progress_callback(describeWorkload(report), 0)
+        with stage("scraping"):
+            companies = processURLs(sheets, uniqueURLs, rowsOfURL, xlPath, session, progress_callback)
         return companies
     except PermissionError as pe:
         logging.error(f'PermissionError: {pe}')
@@ -143,6 +174,9 @@ def saveCompanyandPDFs(companies, outputPath, progress_callback):
     """
     Save company and PDF data to an Excel file.
 
+    Both sheets are built column by column in one pass over the companies.  Each company gets a Company ID,
+    numbered in row order, which the PDFs sheet Company formulas look up (see companyLookupFormulas).
+
     Parameters:
     - companies (list): List of Company objects.
     - outputPath (str): Path to the output Excel file.
@@ -150,27 +184,26 @@ def saveCompanyandPDFs(companies, outputPath, progress_callback):
     Returns:
     - None: The function saves the data to the specified Excel file.
     """
-    
-    dfPDFData = []
-    dfCompanyData = []
-
-
-    for count, company in enumerate(companies):
-        logging.info(f"Saving {company.name} to excel")
-        progress = count / len(companies) * 100
-        logging.info(f"Progress - {progress}%")
-        progress_callback(f"Saving Excel...{progress}%", progress)
-        dfCompanyData.append({'Company' : company.name, 'Assets' : 0, 'Plan Participants' : 0})
-        for pdf in company.pdfs:
-            dfPDFData.append({
-                'Company' : f"=IFERROR(VLOOKUP(\"{company.name}\",Companies!A:A, 1, FALSE), \"null\")", 
-                'PDF Title': pdf.title, 
-                'PDF URL': pdf.url, 
-                'Source' : pdf.source})
-            
+    logging.info(f"Saving {len(companies)} companies to excel")
+    progress_callback("Saving Excel...", 50)
+
+    companyNames = pd.Series([company.name for company in companies], dtype = object)
+    companyIds = pd.RangeIndex(1, len(companies) + 1)
+    pdfCounts = [len(company.pdfs) for company in companies]
+    pdfs = [pdf for company in companies for pdf in company.pdfs]
+
     #Create DataFrames
-    dfCompany = pd.DataFrame(dfCompanyData, columns=['Company', 'Assets', 'Plan Participants'])
-    dfPDF = pd.DataFrame(dfPDFData, columns=['Company', 'PDF Title', 'PDF URL', 'Source'])
+    dfCompany = pd.DataFrame({'Company': companyNames, 'Assets': 0, 'Plan Participants': 0, COMPANY_ID_COLUMN: companyIds},
+                             columns=['Company', 'Assets', 'Plan Participants', COMPANY_ID_COLUMN])
+    pdfCompanyNames = companyNames.repeat(pdfCounts).reset_index(drop = True)
+    pdfCompanyIds = companyIds.repeat(pdfCounts)
+    dfPDF = pd.DataFrame({
+        'Company': companyLookupFormulas(pdfCompanyNames, pdfCompanyIds, dfCompany),
+        COMPANY_ID_COLUMN: pdfCompanyIds,
+        'PDF Title': [pdf.title for pdf in pdfs],
+        'PDF URL': [pdf.url for pdf in pdfs],
+        'Source': [pdf.source for pdf in pdfs]},
+        columns=['Company', COMPANY_ID_COLUMN, 'PDF Title', 'PDF URL', 'Source'])
 
     #Write DataFrames to Excel file
     try:
@@ -183,21 +216,31 @@ def saveCompanyandPDFs(companies, outputPath, progress_callback):
 
 
 
-def generateXLSheet(inputPath, progress_callback):
+def generateXLSheet(inputPath, progress_callback, incremental = False, failuresOnly = False):
     """
     Generate an Excel sheet with company and PDF data.
 
     Parameters:
     - inputPath (Path): Path to the input Excel file containing company data.
+    - incremental (bool, optional): Merge the results into the previous output and write a Changes sheet
+      instead of rebuilding the output from scratch. Default is False.
+    - failuresOnly (bool, optional): Only re-scrape the URLs that failed with fetch errors last time and merge
+      the companies found into the previous output, listing their PDFs as added. Default is False.
 
     Returns:
     - None: The function creates an Excel sheet with company and PDF data.
     """
     try:
-        companies = extractTAExcel(inputPath, progress_callback)
+        companies = extractTAExcel(inputPath, progress_callback, failuresOnly)
         outputPath = inputPath.parent / Path(f"{inputPath.stem}_ScrapedPDFs.xlsx")
-        if not stop_flag:
-            saveCompanyandPDFs(companies, outputPath, progress_callback)
+        previousOutput = loadPreviousOutput(outputPath) if incremental or failuresOnly else None
+        if stop_flag:
+            return None
+        with stage("saveCompanyandPDFs"):
+            if previousOutput is not None:
+                saveChangedCompanyandPDFs(companies, outputPath, previousOutput, progress_callback)
+            else:
+                saveCompanyandPDFs(companies, outputPath, progress_callback)
     except Exception as e:
         logging.exception(f"Error generating Excel sheet: {e}")
         raise e
@@ -207,33 +250,106 @@ def generateXLSheet(inputPath, progress_callback):
 
 
 
-def downloadPDF(pdfURL,filePath, maxRetries = 3, retryDelay = 1):
+def downloadPDF(pdfURL,filePath, maxRetries = 3, retryDelay = 1, scheduler = None, session = None):
     """
     Download a PDF from the given URL and save it to the specified file path.
 
+    When the download cache is enabled, a PDF that another job already saved is copied from that job's
+    file instead of being downloaded again.
+
     Parameters:
     - pdfURL (str): The URL of the PDF to download.
     - filePath (str): The local file path to save the downloaded PDF.
     - maxRetries (int, optional): Maximum number of download retries in case of failure. Default is 3.
     - retryDelay (int, optional): Delay (in seconds) between download retries. Default is 1.
+    - scheduler (DownloadScheduler, optional): Enforces the per-host connection limit and bandwidth cap.
+    - session (requests.Session, optional): Session to download with. Defaults to the shared pooled session.
 
     Returns:
-    - bool: True if the PDF is successfully downloaded, False otherwise.
+    - tuple: (success, contentLength)
+      - success (bool): True if the PDF is successfully downloaded, False otherwise.
+      - contentLength (int or None): The Content-Length of the response the file was saved from, if the
+        server sent one for an uncompressed body.
     """
     if stop_flag:
-        return False
+        return False, None
+    if downloadCache is None:
+        return fetchPDF(pdfURL, filePath, maxRetries, retryDelay, scheduler, session)
+
+    def fetch():
+        success, contentLength = fetchPDF(pdfURL, filePath, maxRetries, retryDelay, scheduler, session)
+        return (filePath, contentLength) if success else None
+    cached = downloadCache.getOrCompute(resourceKey(pdfURL), fetch, cacheable = lambda saved: saved is not None)
+    if cached is None:
+        return False, None
+    cachedPath, contentLength = cached
+    if os.path.abspath(cachedPath) != os.path.abspath(filePath):
+        try:
+            shutil.copyfile(cachedPath, filePath)
+            logging.info(f"Copied {pdfURL} from {cachedPath}")
+        except OSError as e:
+            #The earlier copy was moved or deleted, so download it again
+            logging.warning(f"Could not copy {cachedPath}: {e}")
+            downloadCache.invalidate(resourceKey(pdfURL))
+            return downloadPDF(pdfURL, filePath, maxRetries, retryDelay, scheduler, session)
+    return True, contentLength
+
+
+def fetchPDF(pdfURL, filePath, maxRetries, retryDelay, scheduler, session):
+    session = session or getSession()
+    redirects = getRedirectCache()
+    targetURL = redirects.resolve(pdfURL)
     retries = 0
     while retries < maxRetries:
         try:
-            with urllib.request.urlopen(pdfURL) as response, open(filePath, 'wb') as out_file:
-                data = response.read()
-                out_file.write(data)
-            return True
-        except (URLError, HTTPError, RemoteDisconnected) as e:
+            hostSlot = scheduler.hostSlot(targetURL) if scheduler else contextlib.nullcontext()
+            with hostSlot, session.get(targetURL, stream = True) as response:
+                redirects.recordResponse(pdfURL, response)
+                response.raise_for_status()
+                with open(filePath, 'wb') as out_file:
+                    #Stream in chunks so the bandwidth cap is applied while the transfer runs
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if scheduler:
+                            scheduler.throttle(len(chunk))
+                        out_file.write(chunk)
+            return True, savedContentLength(response)
+        except requests.exceptions.RequestException as e:
             logging.warning(f"Download PDF {pdfURL} Error {retries}: {e}")
+            if isinstance(e, requests.exceptions.HTTPError):
+                targetURL = redirects.retryTarget(pdfURL, targetURL)
             retries += 1
             time.sleep(retryDelay)
-    return False
+    return False, None
+
+
+def recordValidations(dfPDF, validations):
+    """
+    Write the Valid, SHA256 and Pages columns of the PDFs sheet, keeping earlier results for PDFs that
+    were not downloaded this run.
+
+    Parameters:
+    - dfPDF (DataFrame): The PDFs sheet.
+    - validations (dict): Maps each PDF URL to its validationColumns values.
+
+    Returns:
+    - None: dfPDF is updated in place.
+    """
+    if not validations:
+        return
+    dfValidation = pd.DataFrame.from_dict(validations, orient = 'index', columns = ['Valid', 'SHA256', 'Pages'])
+    for column in dfValidation.columns:
+        newValues = dfPDF['PDF URL'].map(dfValidation[column])
+        dfPDF[column] = newValues.combine_first(dfPDF[column]) if column in dfPDF.columns else newValues
+
+
+def enableDownloadCache(ttl):
+    """
+    Remember for ttl seconds where each PDF URL was saved so later jobs copy the file instead of downloading
+    it again.  After that the PDF is fetched again, in case it was republished under the same URL.
+    """
+    global downloadCache
+    downloadCache = SingleFlightCache(ttl)
+    return downloadCache
 
 
 
@@ -254,22 +370,9 @@ def addCompanyLinks(inputPath):
     with pd.ExcelFile(inputPath, engine='openpyxl') as xls:
         dfCompany = pd.read_excel(xls, sheet_name='Companies')
 
-    companyHotlinks= {}
-    lock = threading.Lock()
-
-    def downloadAndSave(company):
-        fileDirectory=""
-        if pd.notna(company): 
-            fileDirectory = inputPath.parent / Path(company)
-        with lock:
-            companyHotlinks[company]= fileDirectory
-
-    
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        executor.map(downloadAndSave, dfCompany['Company'])
-    
-    
-    dfCompany['Hotlink'] = dfCompany['Company'].map(companyHotlinks)
+    #Use the same folder names planTargetPaths created
+    companyFolders = sanitizeNames(dfCompany['Company'], default = "Unnamed Company")
+    dfCompany['Hotlink'] = (str(inputPath.parent) + os.sep + companyFolders).fillna("")
     dfCompany['Hotlink'] = dfCompany['Hotlink'].apply(lambda x: f'=HYPERLINK("{x}", "CLICK FOR FOLDER")')
 
     with pd.ExcelWriter(inputPath, if_sheet_exists='replace', mode='a') as writer:
@@ -281,6 +384,8 @@ def refreshExcel(inputPath):
     """
     Refresh all data connections and calculations in an Excel workbook.
 
+    Only one refresh runs at a time, since another job's Quit would close the Excel instance mid refresh.
+
     Parameters:
     - inputPath (Path): Path to the Excel file to be refreshed.
 
@@ -288,28 +393,65 @@ def refreshExcel(inputPath):
     - None: The function refreshes the workbook and saves the changes.
     """
     logging.info(f"Input Path: {inputPath}")
-    pythoncom.CoInitialize()
-    File = win32com.client.Dispatch("Excel.Application")    
-    File.Visible = 1
-    Workbook = File.Workbooks.open(str(inputPath))
-    Workbook.RefreshAll()
-    Workbook.Save()
-    File.Quit()
-    pythoncom.CoUninitialize()
+    with excelLock:
+        pythoncom.CoInitialize()
+        File = win32com.client.Dispatch("Excel.Application")    
+        File.Visible = 1
+        Workbook = File.Workbooks.open(str(inputPath))
+        Workbook.RefreshAll()
+        Workbook.Save()
+        File.Quit()
+        pythoncom.CoUninitialize()
+
+
+def savePDFLinks(inputPath, dfPDF, localFilePaths):
+    """
+    Write the local file hyperlinks for each downloaded PDF back to the PDFs sheet and add the company folder links.
 
+    Parameters:
+    - inputPath (Path): Path to the Excel file containing the PDFs sheet.
+    - dfPDF (DataFrame): The PDFs sheet as read before downloading.
+    - localFilePaths (dict): Maps each PDF URL to the local file path it was saved to.
 
-def extractPDFPages(inputPath, progress_callback):
+    Returns:
+    - None: The function saves the modified Excel file.
     """
-    Extract PDF data from an Excel file, download PDFs, and update the Excel file.
+    # Update 'Local FilePath' column based on the corresponding pdfURL
+    dfPDF['Local FilePath'] = dfPDF['PDF URL'].map(localFilePaths)
+    dfPDF['Local FilePath'] = dfPDF['Local FilePath'].apply(lambda x: f'=HYPERLINK("{x}", "CLICK FOR FILE")')
+
+    with pd.ExcelFile(inputPath, engine='openpyxl') as xls:
+        dfCompany = pd.read_excel(xls, sheet_name='Companies')
+    #Rebuild the formulas from the scraped names, not the refreshed values, which read "null" for deleted companies
+    companyNames = originalCompanyNames(inputPath, dfPDF)
+    if COMPANY_ID_COLUMN in dfPDF.columns and COMPANY_ID_COLUMN in dfCompany.columns:
+        dfPDF['Company'] = companyLookupFormulas(companyNames, dfPDF[COMPANY_ID_COLUMN], dfCompany)
+    else:
+        dfPDF['Company'] = companyNames.fillna("null").apply(companyLookupFormula)
+
+    try:
+        with pd.ExcelWriter(inputPath, if_sheet_exists='replace', mode='a') as writer:
+            dfPDF.to_excel(writer, sheet_name = "PDFs", index = False)
+    except Exception as e:
+        logging.error(f"Error saving: {e}")
+        raise e
+
+    addCompanyLinks(inputPath)
+
+
+def readRefreshedPDFs(inputPath):
+    """
+    Refresh the Excel workbook so the Company formulas are calculated, then read the PDFs sheet.  A Companies
+    sheet an analyst sorted by another column is put back in Company ID order first.
 
     Parameters:
     - inputPath (Path): Path to the input Excel file containing PDF data.
 
     Returns:
-    - None: The function downloads PDFs, updates the Excel file, and adds hyperlinks.
-    """  
-
-
+    - DataFrame: The PDFs sheet with the calculated Company values.
+    """
+    #The Company formulas only find the right company while the Company ID column is sorted
+    sortCompaniesById(inputPath)
     logging.info("Refreshing excel")
 
     # Create an event object
@@ -338,92 +480,196 @@ def extractPDFPages(inputPath, progress_callback):
     #Save PDF pages on excel document to local directory
     with pd.ExcelFile(inputPath, engine='openpyxl') as xls:
         dfPDF = pd.read_excel(xls, sheet_name = 'PDFs', engine='openpyxl')
-    
+    return dfPDF
+
+
+def extractPDFPages(inputPath, progress_callback, changesOnly = False):
+    """
+    Extract PDF data from an Excel file, download PDFs, and update the Excel file.
+
+    Parameters:
+    - inputPath (Path): Path to the input Excel file containing PDF data.
+    - changesOnly (bool, optional): Only download the PDFs listed as added in the Changes sheet of an
+      incremental scrape.  The other PDFs are assumed to be saved from an earlier run. Default is False.
+
+    Returns:
+    - None: The function downloads PDFs, updates the Excel file, and adds hyperlinks.
+    """  
+
+
+    with stage("readRefreshedPDFs"):
+        dfPDF = readRefreshedPDFs(inputPath)
+
     localFilePaths = {}
     lock = threading.Lock()
 
+    @trackThread
     def downloadAndSave(pdfData):
-        pdfURL, pdfTitle, company = pdfData
+        pdfURL, pdfTitle, company, targetPath = pdfData
         
         logging.info(f"Company {company}")
 
         filePath = "null"
+        success, contentLength = False, None
 
-        if pd.notna(company) and not stop_flag:    
-            fileDirectory = inputPath.parent / Path(company)
-            #Create the local company directory if it does not exist
-            if not os.path.exists(fileDirectory):
-                os.makedirs(fileDirectory)
-            
-            #Replace instances of / as will mess up file path
-            pdfTitle = pdfTitle.replace("/","-").replace("\n", "")
-            filePath = fileDirectory / Path(f"{pdfTitle}.pdf")
+        if pd.notna(targetPath) and not stop_flag:
+            filePath = targetPath
             try:
                 #Download the pdf and save to the local file path
-                success = downloadPDF(pdfURL, filePath)
+                success, contentLength = downloadPDF(pdfURL, filePath, scheduler = scheduler)
                 if success:
                     logging.info(f"{pdfTitle} saved successfully")
                 else:
                     logging.warning(f"Failed to download {pdfTitle} {company}")
             except Exception as e:
-                logging.error(f"Error downloading {pdfTitle}: {e}")
-                raise e
+                #One unwritable file or bad response must not stop the other downloads
+                logging.exception(f"Error downloading {pdfTitle}: {e}")
         with lock:
                 localFilePaths[pdfURL] = filePath
-        return None
-
-    totalSaves = len(dfPDF)
-    completedSaves = 0
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Use list to force evaluation of all futures
-        futures = {executor.submit(downloadAndSave, data): data for data in zip(dfPDF['PDF URL'], dfPDF['PDF Title'], dfPDF['Company'])}
-
-        for future in concurrent.futures.as_completed(futures):
-            if stop_flag:
-                break
+        return success, contentLength
+
+    with stage("planning"):
+        pending = pd.Series(True, index = dfPDF.index)
+        savedPaths = None
+        if changesOnly:
+            addedURLs = readAddedURLs(inputPath)
+            if addedURLs is None:
+                logging.warning(f"No Changes sheet in {inputPath}. Downloading every PDF")
             else:
+                pending = dfPDF['PDF URL'].isin(addedURLs)
+                #PDFs that are not in the change report keep the file an earlier run saved them to.  Their
+                #names are not planned again, as the collision suffixes shift once a row is removed
+                savedPaths = savedFilePaths(inputPath, dfPDF).where(~pending)
+
+        #Plan every target path and company folder before any download starts
+        targetPaths = planTargetPaths(dfPDF, inputPath.parent, savedPaths)
+        if savedPaths is not None:
+            localFilePaths.update(zip(dfPDF.loc[~pending, 'PDF URL'], targetPaths[~pending].fillna("null")))
+            logging.info(f"Downloading {pending.sum()} changed PDFs of {len(dfPDF)}")
+
+        #Download each PDF once however many rows list it, under whichever form of its URL, preferring a
+        #row whose company is still in the Companies sheet.  The other rows link to the same file
+        dfPending = dfPDF[pending]
+        pendingKeys = dfPending['PDF URL'].map(resourceKey)
+        preferred = targetPaths[pending].notna().sort_values(ascending = False, kind = "stable").index
+        unique = preferred[~pendingKeys[preferred].duplicated().values]
+        urlOfKey = dict(zip(pendingKeys[unique], dfPending.loc[unique, 'PDF URL']))
+        aliasOf = {url: urlOfKey[key] for url, key in zip(dfPending['PDF URL'], pendingKeys)
+                   if isinstance(url, str) and url != urlOfKey.get(key, url)}
+        if aliasOf:
+            logging.info(f"{len(aliasOf)} PDF URLs are other forms of URLs already being downloaded")
+        dfUnique = dfPending.loc[unique.sort_values()]
+
+        #Size the downloads from the Size column of the previous run, or with HEAD requests on the first run,
+        #so the longest transfers start first
+        scheduler = DownloadScheduler()
+        knownSizes = dict(zip(dfPDF['PDF URL'], dfPDF['Size'])) if 'Size' in dfPDF.columns else None
+        sizes = scheduler.probeSizes(dfUnique.loc[dfUnique['Company'].notna(), 'PDF URL'], getSession(), knownSizes)
+        sizes.update({url: sizes.get(representative) for url, representative in aliasOf.items()})
+        dfPDF['Size'] = dfPDF['PDF URL'].map(sizes)
+        jobs = scheduler.order(zip(dfUnique['PDF URL'], dfUnique['PDF Title'], dfUnique['Company'], targetPaths[dfUnique.index]), sizes)
+
+    totalSaves = len(jobs)
+    completedSaves = 0
+    validations = {}
+    attempts = {}
+    responseSizes = {}
+
+    #Each finished download is validated in a separate process while the other downloads keep running.
+    #Files that fail validation are queued for download again
+    with stage("downloading"), concurrent.futures.ThreadPoolExecutor() as executor, concurrent.futures.ProcessPoolExecutor() as validator:
+        downloadFutures = {executor.submit(downloadAndSave, data): data for data in jobs}
+        validationFutures = {}
+
+        while (downloadFutures or validationFutures) and not stop_flag:
+            done, _ = concurrent.futures.wait(list(downloadFutures) + list(validationFutures), return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future in downloadFutures:
+                    data = downloadFutures.pop(future)
+                    pdfURL, targetPath = data[0], data[3]
+                    attempts[pdfURL] = attempts.get(pdfURL, 0) + 1
+                    if future.exception() is None and future.result()[0]:
+                        #Check the file against the response it was saved from; the manifest size may be stale
+                        contentLength = future.result()[1]
+                        if contentLength is not None:
+                            responseSizes[pdfURL] = contentLength
+                        validationFutures[validator.submit(validatePDF, targetPath, contentLength)] = data
+                        continue
+                    if future.exception() is not None:
+                        logging.error(f"Error downloading {pdfURL}: {future.exception()}")
+                        with lock:
+                            localFilePaths.setdefault(pdfURL, "null")
+                    if pd.notna(targetPath):
+                        validations[pdfURL] = ("Download failed", None, None)
+                else:
+                    data = validationFutures.pop(future)
+                    pdfURL = data[0]
+                    if future.exception() is not None:
+                        logging.error(f"Could not validate {pdfURL}: {future.exception()}")
+                        validations[pdfURL] = ("Validation failed", None, None)
+                    else:
+                        result = future.result()
+                        validations[pdfURL] = validationColumns(result)
+                        if not result['valid'] and downloadCache is not None:
+                            downloadCache.invalidate(resourceKey(pdfURL))
+                        if not result['valid'] and attempts[pdfURL] < MAX_DOWNLOAD_ATTEMPTS:
+                            logging.warning(f"Invalid download {pdfURL}: {result['reason']}. Downloading again")
+                            downloadFutures[executor.submit(downloadAndSave, data)] = data
+                            continue
                 completedSaves+=1
                 progress = (completedSaves/ totalSaves) * 100
                 progress_callback(f"Loading...{progress}%", progress)
-        
+
+        if stop_flag:
+            for future in downloadFutures:
+                future.cancel()
         executor.shutdown(wait=True)  # This ensures that all threads finish before the program exits
 
     if stop_flag:
         return None
-        
-    # Update 'Local FilePath' column based on the corresponding pdfURL
-    dfPDF['Local FilePath'] = dfPDF['PDF URL'].map(localFilePaths)
-    dfPDF['Local FilePath'] = dfPDF['Local FilePath'].apply(lambda x: f'=HYPERLINK("{x}", "CLICK FOR FILE")')
 
-    try:
-        with pd.ExcelWriter(inputPath, if_sheet_exists='replace', mode='a') as writer:
-            dfPDF['Company'] = dfPDF['Company'].apply(lambda x: f"=IFERROR(VLOOKUP(\"{x}\",Companies!A:A, 1, FALSE), \"null\")")
-            dfPDF.to_excel(writer, sheet_name = "PDFs", index = False)
-    except Exception as e:
-        logging.error(f"Error saving: {e}")
-        raise e
+    for url, representative in aliasOf.items():
+        localFilePaths[url] = localFilePaths.get(representative, "null")
+        if representative in validations:
+            validations[url] = validations[representative]
+        if representative in responseSizes:
+            responseSizes[url] = responseSizes[representative]
 
-    addCompanyLinks(inputPath)
+    #Record the sizes the servers reported this run, so the next run orders its downloads by them
+    dfPDF['Size'] = dfPDF['PDF URL'].map(responseSizes).combine_first(dfPDF['Size'])
+
+    recordValidations(dfPDF, validations)
+
+    with stage("savePDFLinks"):
+        savePDFLinks(inputPath, dfPDF, localFilePaths)
     return None
     
 
 
 
-def handleScraping(inputPath, progress_callback):
+def handleScraping(inputPath, progress_callback, incremental = False, profile = False, failuresOnly = False):
     try:
-        generateXLSheet(inputPath, progress_callback)
+        with profiledRun(profileDirectoryFor(inputPath, "scrape"), profile):
+            generateXLSheet(inputPath, progress_callback, incremental, failuresOnly)
     except KeyError as ke:
         raise KeyError("Make sure to include URL key in excel")
     except Exception as e:
         raise e
 
-def handleDownload(inputPath, progress_callback):
-    try:
-        extractPDFPages(inputPath, progress_callback)
-    except Exception as e:
-        logging.error(f"Download error: {e}")
-        raise e
+def handleDownload(inputPath, progress_callback, changesOnly = False, profile = False, index = True):
+    with profiledRun(profileDirectoryFor(inputPath, "download"), profile):
+        try:
+            extractPDFPages(inputPath, progress_callback, changesOnly)
+        except Exception as e:
+            logging.error(f"Download error: {e}")
+            raise e
+        #The PDFs are saved at this point, so a failed index update is only logged
+        try:
+            if index and not stop_flag:
+                with stage("indexing"):
+                    indexWorkbook(inputPath, progress_callback)
+        except Exception as e:
+            logging.exception(f"Error indexing PDFs: {e}")
 
 def stopProcessing():
     global stop_flag
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+
+class SingleFlightCache:
+    """
+    Thread safe cache that computes each key at most once at a time.
+
+    When several threads (or several jobs) ask for the same key together, the first one computes the value
+    and the others wait for its result instead of repeating the work.  Results for which cacheable returns
+    False (for example transient fetch errors) are handed to the waiting callers but not kept.
+
+    Parameters:
+    - ttl (int, optional): Seconds a cached value stays valid. None keeps values until invalidated.
+    """
+
+    def __init__(self, ttl = None):
+        self.ttl = ttl
+        self.values = {}
+        self.inFlight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getOrCompute(self, key, compute, cacheable = lambda value: True):
+        while True:
+            with self.lock:
+                cached = self.values.get(key)
+                if cached is not None and (self.ttl is None or cached[0] > time.monotonic()):
+                    self.hits += 1
+                    return cached[1]
+                pending = self.inFlight.get(key)
+                if pending is None:
+                    pending = self.inFlight[key] = {'done': threading.Event(), 'value': None, 'error': None}
+                    owner = True
+                    self.misses += 1
+                else:
+                    owner = False
+                    self.hits += 1
+
+            if not owner:
+                pending['done'].wait()
+                if pending['error'] is not None:
+                    #The computing thread failed, so try again ourselves
+                    continue
+                return pending['value']
+
+            try:
+                value = compute()
+            except Exception as e:
+                pending['error'] = e
+                raise
+            else:
+                pending['value'] = value
+                if cacheable(value):
+                    with self.lock:
+                        self.values[key] = (time.monotonic() + self.ttl if self.ttl else None, value)
+                return value
+            finally:
+                with self.lock:
+                    del self.inFlight[key]
+                pending['done'].set()
+
+    def invalidate(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.values), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+        logging.info("Cache cleared")
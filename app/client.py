@@ -0,0 +1,57 @@
+from app.httpclient import TIMEOUT
+import requests
+import time
+
+
+POLL_SECONDS = 1
+
+
+def submitJob(serverURL, kind, inputPath, **options):
+    """
+    Queue a scrape or download job on a job server (see app.server).
+
+    Parameters:
+    - serverURL (str): Base URL of the server, e.g. http://harvest-pc:5123.
+    - kind (str): "scrape" or "download".
+    - inputPath (Path): The workbook, as a path the server can open.
+    - options: incremental and failuresOnly for scrape jobs, changesOnly and index for download jobs.
+
+    Returns:
+    - str: The job ID.
+    """
+    response = requests.post(f"{serverURL.rstrip('/')}/jobs", json = {'kind': kind, 'path': str(inputPath), 'options': options}, timeout = TIMEOUT)
+    if response.status_code >= 400:
+        raise Exception(response.json().get('error', response.text))
+    return response.json()['id']
+
+
+def waitForJob(serverURL, jobId, progress_callback, shouldStop = lambda: False):
+    """
+    Poll a job until it finishes, passing its progress to progress_callback.
+
+    Returns:
+    - str: The job result (the output workbook of a scrape, or the folder of a download).
+
+    Raises:
+    - Exception: If the job failed on the server.
+    """
+    while not shouldStop():
+        response = requests.get(f"{serverURL.rstrip('/')}/jobs/{jobId}", timeout = TIMEOUT)
+        response.raise_for_status()
+        job = response.json()
+        if job['status'] == "done":
+            return job['result']
+        if job['status'] == "failed":
+            raise Exception(job['error'])
+        progress_callback(job['message'], job['progress'])
+        time.sleep(POLL_SECONDS)
+    return None
+
+
+def runJob(serverURL, kind, inputPath, progress_callback, shouldStop = lambda: False, **options):
+    """
+    Submit a job and wait for it to finish.
+    """
+    jobId = submitJob(serverURL, kind, inputPath, **options)
+    progress_callback("Queued on server...", 0)
+    return waitForJob(serverURL, jobId, progress_callback, shouldStop)
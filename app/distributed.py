@@ -0,0 +1,320 @@
+from app.backend import downloadPDF, updateExcel, saveCompanyandPDFs, readRefreshedPDFs, savePDFLinks, readTASheets, recordValidations
+from app.preflight import preflightURLs, describeWorkload
+from app.scraper import scrape_pdf_links
+from app.paths import planTargetPaths
+from app.validation import validatePDF, validationColumns, MAX_DOWNLOAD_ATTEMPTS
+from app.httpclient import getSession
+from app.workqueue import SQLiteWorkQueue, DEFAULT_LEASE_SECONDS, PENDING, LEASED, FAILED
+from classes.Company import Company
+from config.logging_config import configure_logging
+from pathlib import Path
+import pandas as pd
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+SCRAPE = "scrape"
+DOWNLOAD = "download"
+
+
+##########################################################################
+# Coordinator
+
+
+def enqueueScrapeJobs(inputPaths, queue, runId = None):
+    """
+    Split the input workbooks into one scrape work item per unique URL and add them to the queue.
+
+    Each item lists every row, on any sheet of its workbook, that refers to the URL.  Blank and malformed
+    URLs are not queued; their status is written when the results are merged.
+
+    Parameters:
+    - inputPaths (list): Paths to the TA URL Excel files.
+    - queue (WorkQueue): The shared work queue.
+    - runId (str, optional): The coordinator run the items belong to.
+
+    Returns:
+    - int: The number of work items queued.
+    """
+    total = 0
+    for inputPath in inputPaths:
+        with pd.ExcelFile(inputPath) as xls:
+            sheets = readTASheets(xls)
+        uniqueURLs, rowsOfURL, report = preflightURLs(sheets)
+        payloads = [{'workbook': str(inputPath), 'url': url,
+                     'rows': {sheetName: [int(row) for row in rows] for sheetName, rows in rowsOfURL[key].items()}}
+                    for key, url in uniqueURLs.items()]
+        queue.put(SCRAPE, payloads, runId)
+        total += len(payloads)
+        logging.info(f"Queued {inputPath}: {describeWorkload(report)}")
+    return total
+
+
+def enqueueDownloadJobs(inputPath, queue, runId = None):
+    """
+    Queue one download work item per PDF row whose company was kept in the Companies sheet.
+
+    Parameters:
+    - inputPath (Path): Path to the scraped PDFs Excel file.
+    - queue (WorkQueue): The shared work queue.
+    - runId (str, optional): The coordinator run the items belong to.
+
+    Returns:
+    - DataFrame: The PDFs sheet, needed again when the results are merged.
+    """
+    dfPDF = readRefreshedPDFs(inputPath)
+    targetPaths = planTargetPaths(dfPDF, inputPath.parent)
+    payloads = [{'url': pdfURL, 'filePath': targetPath}
+                for pdfURL, targetPath in zip(dfPDF['PDF URL'], targetPaths) if pd.notna(targetPath)]
+    queue.put(DOWNLOAD, payloads, runId)
+    logging.info(f"Queued {len(payloads)} download items from {inputPath}")
+    return dfPDF
+
+
+def waitForQueue(queue, progress_callback, pollInterval = 5, runId = None):
+    """
+    Block until every item of the run is finished, reporting progress as workers complete items.
+
+    Items leased by workers that stopped renewing their lease are handed to other workers by the queue itself.
+    """
+    while True:
+        counts = queue.counts(runId)
+        total = sum(counts.values())
+        remaining = counts.get(PENDING, 0) + counts.get(LEASED, 0)
+        progress = (total - remaining) / total * 100 if total else 100
+        logging.info(f"Queue status - {counts}")
+        progress_callback(f"Loading...{progress}%", progress)
+        if remaining == 0:
+            return
+        time.sleep(pollInterval)
+
+
+def mergeScrapeResults(inputPaths, queue, progress_callback, runId = None):
+    """
+    Write the worker results back to each input workbook's Active column and to its _ScrapedPDFs.xlsx output.
+
+    Every workbook is merged, including those with no valid URLs and so no queued items, so their blank
+    and malformed URL statuses and their (empty) output are still written.
+
+    Parameters:
+    - inputPaths (list): Paths to the TA URL Excel files that were queued.
+    - queue (WorkQueue): The shared work queue containing the finished scrape items.
+    - runId (str, optional): Only merge the items of this coordinator run.
+
+    Returns:
+    - None
+    """
+    resultsByWorkbook = {}
+    for item in queue.finished(SCRAPE, runId):
+        resultsByWorkbook.setdefault(item.payload['workbook'], []).append(item)
+
+    for inputPath in inputPaths:
+        inputPath = Path(inputPath)
+        items = resultsByWorkbook.get(str(inputPath), [])
+        companies = []
+        with pd.ExcelFile(inputPath) as xls:
+            sheets = readTASheets(xls)
+        #Writes the blank and malformed URL statuses
+        preflightURLs(sheets)
+
+        for item in items:
+            result = item.result or {}
+            if item.status == FAILED or result.get('company') is None:
+                status = str(result.get('error'))
+            else:
+                status = "True"
+            for sheetName, rows in item.payload['rows'].items():
+                sheets[sheetName].loc[rows, 'Active'] = status
+            if status == "True":
+                company = Company(result['company'])
+                for pdfURL, pdfTitle in result['pdfs']:
+                    company.add_pdf(pdfURL, pdfTitle)
+                companies.append(company)
+
+        with pd.ExcelWriter(inputPath, engine='openpyxl') as writer:
+            for sheetName, df in sheets.items():
+                updateExcel(df, writer, sheetName)
+
+        outputPath = inputPath.parent / Path(f"{inputPath.stem}_ScrapedPDFs.xlsx")
+        saveCompanyandPDFs(companies, outputPath, progress_callback)
+        logging.info(f"Merged {len(items)} results into {inputPath} and {outputPath}")
+
+
+def mergeDownloadResults(inputPath, dfPDF, queue, runId = None):
+    """
+    Write the file paths reported by the workers back to the PDFs sheet as hyperlinks, along with the
+    validation results in the Valid, SHA256 and Pages columns.
+    """
+    localFilePaths = {}
+    responseSizes = {}
+    validations = {}
+    for item in queue.finished(DOWNLOAD, runId):
+        result = item.result or {}
+        success = bool(result.get('success'))
+        localFilePaths[item.payload['url']] = item.payload['filePath'] if success else "null"
+        if success and result.get('size') is not None:
+            responseSizes[item.payload['url']] = result['size']
+        validation = result.get('validation')
+        validations[item.payload['url']] = validationColumns(validation) if validation else ("Download failed", None, None)
+    if 'Size' in dfPDF.columns:
+        dfPDF['Size'] = dfPDF['PDF URL'].map(responseSizes).combine_first(dfPDF['Size'])
+    recordValidations(dfPDF, validations)
+    savePDFLinks(inputPath, dfPDF, localFilePaths)
+
+
+def runScrapeCoordinator(inputPaths, queue, progress_callback, pollInterval = 5):
+    """
+    Queue the URLs of every input workbook, wait for the workers to process them, and merge the results.
+
+    The items are tagged with a new run ID, so other coordinators sharing the queue are left alone.
+
+    Parameters:
+    - inputPaths (list): Paths to the TA URL Excel files.
+    - queue (WorkQueue): The shared work queue.
+    - progress_callback (function): Called with a status message and a percentage.
+    - pollInterval (int, optional): Seconds between queue status checks. Default is 5.
+
+    Returns:
+    - None
+    """
+    runId = uuid.uuid4().hex
+    enqueueScrapeJobs(inputPaths, queue, runId)
+    waitForQueue(queue, progress_callback, pollInterval, runId)
+    mergeScrapeResults(inputPaths, queue, progress_callback, runId)
+    queue.clear(runId)
+
+
+def runDownloadCoordinator(inputPath, queue, progress_callback, pollInterval = 5):
+    """
+    Queue the PDFs of a scraped workbook, wait for the workers to download them, and add the hyperlinks.
+
+    The company folders are created by the coordinator, so the workbook's directory must be on a volume
+    that every worker can write to.
+    """
+    runId = uuid.uuid4().hex
+    dfPDF = enqueueDownloadJobs(inputPath, queue, runId)
+    waitForQueue(queue, progress_callback, pollInterval, runId)
+    mergeDownloadResults(inputPath, dfPDF, queue, runId)
+    queue.clear(runId)
+
+
+##########################################################################
+# Worker
+
+
+def processWorkItem(item, session):
+    """
+    Run a single leased work item and return the JSON serializable result for the coordinator.
+    """
+    if item.kind == SCRAPE:
+        company, error = scrape_pdf_links(item.payload['url'], session)
+        if company is None:
+            return {'company': None, 'error': error}
+        return {'company': company.name, 'pdfs': [[pdf.url, pdf.title] for pdf in company.pdfs], 'error': None}
+    elif item.kind == DOWNLOAD:
+        success, contentLength = downloadPDF(item.payload['url'], item.payload['filePath'], session = session)
+        if not success:
+            return {'success': False, 'size': None, 'validation': None}
+        return {'success': True, 'size': contentLength, 'validation': validatePDF(item.payload['filePath'], contentLength)}
+    raise ValueError(f"Unknown work item kind {item.kind}")
+
+
+def runWorker(queue, workerId = None, leaseSeconds = DEFAULT_LEASE_SECONDS, pollInterval = 5, exitWhenIdle = False):
+    """
+    Lease work items from the shared queue and process them until stopped.
+
+    While an item is being processed its lease is renewed in the background, so only a worker that has
+    died (or lost its connection to the queue) lets its items expire and be re-leased by another worker.
+
+    Parameters:
+    - queue (WorkQueue): The shared work queue.
+    - workerId (str, optional): Name recorded on leased items. Defaults to host and process id.
+    - leaseSeconds (int, optional): How long a lease lasts without being renewed.
+    - pollInterval (int, optional): Seconds to wait when the queue has no available items.
+    - exitWhenIdle (bool, optional): Return once the queue is drained instead of waiting for more work.
+
+    Returns:
+    - int: The number of items this worker completed.
+    """
+    workerId = workerId or f"{socket.gethostname()}-{os.getpid()}"
+    session = getSession()
+
+    completed = 0
+    logging.info(f"Worker {workerId} started")
+    while True:
+        item = queue.lease(workerId, leaseSeconds)
+        if item is None:
+            if exitWhenIdle and queue.isDrained():
+                logging.info(f"Worker {workerId} finished after {completed} items")
+                return completed
+            time.sleep(pollInterval)
+            continue
+
+        done = threading.Event()
+
+        def renewLease():
+            while not done.wait(leaseSeconds / 3):
+                if not queue.renew(item.itemId, workerId, leaseSeconds):
+                    logging.warning(f"Worker {workerId} lost the lease on {item.itemId}")
+                    return
+
+        renewThread = threading.Thread(target = renewLease, daemon = True)
+        renewThread.start()
+        try:
+            result = processWorkItem(item, session)
+        except Exception as e:
+            logging.exception(f"Worker {workerId} failed on {item}: {e}")
+            result = {'company': None, 'success': False, 'error': f"Worker error: {e}"}
+        finally:
+            done.set()
+            renewThread.join()
+
+        #Files that fail validation go back in the queue, so this or another worker downloads them again
+        validation = result.get('validation')
+        if validation and not validation['valid'] and item.attempts < MAX_DOWNLOAD_ATTEMPTS:
+            logging.warning(f"Invalid download {item.payload['url']}: {validation['reason']}. Queueing it again")
+            queue.release(item.itemId, workerId)
+            continue
+
+        if queue.complete(item.itemId, workerId, result):
+            completed += 1
+
+
+##########################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Distributed PDF harvesting through a shared work queue")
+    parser.add_argument("--queue", required = True, help = "Path to the SQLite queue file on a shared volume")
+    subparsers = parser.add_subparsers(dest = "mode", required = True)
+
+    scrapeParser = subparsers.add_parser("scrape", help = "Coordinate a scrape of one or more TA URL workbooks")
+    scrapeParser.add_argument("workbooks", nargs = "+")
+
+    downloadParser = subparsers.add_parser("download", help = "Coordinate the PDF downloads for a scraped workbook")
+    downloadParser.add_argument("workbook")
+
+    workerParser = subparsers.add_parser("worker", help = "Process work items from the queue")
+    workerParser.add_argument("--id", default = None)
+    workerParser.add_argument("--exit-when-idle", action = "store_true")
+
+    args = parser.parse_args()
+    configure_logging(Path(f"LogFile_{args.mode}.log"))
+    queue = SQLiteWorkQueue(args.queue)
+    printProgress = lambda text, value: print(text)
+
+    if args.mode == "scrape":
+        runScrapeCoordinator([Path(workbook) for workbook in args.workbooks], queue, printProgress)
+    elif args.mode == "download":
+        runDownloadCoordinator(Path(args.workbook), queue, printProgress)
+    else:
+        runWorker(queue, args.id, exitWhenIdle = args.exit_when_idle)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import tkinter
 from app.backend import handleScraping, handleDownload, stopProcessing
+from app.search import indexPathFor, searchIndex
+from app.client import runJob
 import logging 
 from pathlib import Path
 from threading import Thread, Event
 from tkinter import ttk
 import pythoncom
 import time
+import os
 
 
 stop_flag = False
@@ -13,8 +16,9 @@ stop_flag = False
 class PDFHarvestingApp:
     def __init__(self, window):
         self.window = window
-        self.window.geometry("450x500")
+        self.window.geometry("500x880")
         self.window.title("PDF Harvesting Application")
+        self.closing = Event()
         self.create_gui_elements()
 
         self.window.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -30,12 +34,18 @@ class PDFHarvestingApp:
         self.topProgressBar = ttk.Progressbar(top_frame, orient="horizontal", length = 0, mode = 'determinate')
         self.TAURLFileEntry = tkinter.Entry(top_frame, width = 50)
         self.processURLButton = tkinter.Button(top_frame, text = "Scrape PDFs", command=lambda: self.start_thread(self.handlePDFScraping))
+        self.incrementalScrape = tkinter.BooleanVar(value = False)
+        self.incrementalCheck = tkinter.Checkbutton(top_frame, text = "Only record changes (keep edited Companies sheet)", variable = self.incrementalScrape)
+        self.failuresOnlyScrape = tkinter.BooleanVar(value = False)
+        self.failuresOnlyCheck = tkinter.Checkbutton(top_frame, text = "Only re-run URLs that failed to load last time", variable = self.failuresOnlyScrape)
         self.topResultLabel = tkinter.Label(top_frame, wraplength = 400)
 
         self.topLabel.pack(padx = 20, pady = 20)
         self.TAURLFileEntry.pack()
         self.topWarning.pack()
-        self.processURLButton.pack(pady=20)
+        self.processURLButton.pack(pady=(20, 0))
+        self.incrementalCheck.pack()
+        self.failuresOnlyCheck.pack(pady=(0, 20))
         self.topProgressBar.pack()
         self.topResultLabel.pack()
 
@@ -44,14 +54,43 @@ class PDFHarvestingApp:
         self.bottomProgressBar = ttk.Progressbar(top_frame, orient="horizontal", length = 0, mode = 'determinate')
         self.PDFFileEntry = tkinter.Entry(bottom_frame, width = 50)
         self.downloadPDFButton = tkinter.Button(bottom_frame, text = "Save PDFs", command=lambda: self.start_thread(self.handlePDFDownloading))
+        self.changesOnlyDownload = tkinter.BooleanVar(value = False)
+        self.changesOnlyCheck = tkinter.Checkbutton(bottom_frame, text = "Only save PDFs added since the last scrape", variable = self.changesOnlyDownload)
+        self.indexDownload = tkinter.BooleanVar(value = True)
+        self.indexCheck = tkinter.Checkbutton(bottom_frame, text = "Update the search index after saving", variable = self.indexDownload)
+        self.profileRuns = tkinter.BooleanVar(value = False)
+        self.profileCheck = tkinter.Checkbutton(bottom_frame, text = "Profile runs (writes a _profile folder next to the file)", variable = self.profileRuns)
         self.bottomResultLabel = tkinter.Label(bottom_frame, wraplength = 400)
 
         self.bottomLabel.pack(padx = 20, pady = 20)
         self.PDFFileEntry.pack()
         self.bottomWarning.pack()
-        self.downloadPDFButton.pack(pady=20)
+        self.downloadPDFButton.pack(pady=(20, 0))
+        self.changesOnlyCheck.pack()
+        self.indexCheck.pack(pady=(0, 20))
         self.bottomProgressBar.pack()
         self.bottomResultLabel.pack()
+        self.profileCheck.pack(pady = (20, 0))
+
+        #Leave blank to run jobs in this window, or enter a shared job server (python -m app.server)
+        self.serverLabel = tkinter.Label(bottom_frame, text="Job server (optional, Ex: http://harvest-pc:5123):")
+        self.serverEntry = tkinter.Entry(bottom_frame, width = 40)
+        self.serverLabel.pack(pady = (10, 0))
+        self.serverEntry.pack()
+
+        #Search panel over the PDFs downloaded for the PDF file location above
+        self.searchLabel = tkinter.Label(bottom_frame, text="Search downloaded PDFs:")
+        self.searchEntry = tkinter.Entry(bottom_frame, width = 40)
+        self.searchButton = tkinter.Button(bottom_frame, text = "Search", command=self.handleSearch)
+        self.searchResults = tkinter.Listbox(bottom_frame, width = 70, height = 8)
+        self.searchHits = []
+
+        self.searchLabel.pack(pady = (20, 0))
+        self.searchEntry.pack()
+        self.searchButton.pack(pady = 5)
+        self.searchResults.pack(padx = 10)
+        self.searchEntry.bind("<Return>", lambda event: self.handleSearch())
+        self.searchResults.bind("<Double-Button-1>", lambda event: self.openSearchHit())
 
 
     def run(self):
@@ -60,6 +99,7 @@ class PDFHarvestingApp:
     def on_close(self):
         logging.info("Exiting Program")
         stopProcessing()
+        self.closing.set()
         self.window.destroy()
 
 
@@ -81,7 +121,12 @@ class PDFHarvestingApp:
         self.updateTopProgress("Loading...", 0)
 
         try:
-            handleScraping(Path(self.TAURLFileEntry.get()), self.updateTopProgress)
+            serverURL = self.serverEntry.get().strip()
+            if serverURL:
+                runJob(serverURL, "scrape", inputPath, self.updateTopProgress, self.closing.is_set,
+                       incremental = self.incrementalScrape.get(), failuresOnly = self.failuresOnlyScrape.get())
+            else:
+                handleScraping(Path(self.TAURLFileEntry.get()), self.updateTopProgress, self.incrementalScrape.get(), self.profileRuns.get(), self.failuresOnlyScrape.get())
             resultText = "Successfully scraped! Check for ScrapedPDFs file in parent directory"
             textColor = "green"
         except PermissionError as pe:
@@ -122,7 +167,12 @@ class PDFHarvestingApp:
         self.updateBottomProgress("Loading...", 0)
 
         try:
-            handleDownload(Path(self.PDFFileEntry.get()), self.updateBottomProgress)
+            serverURL = self.serverEntry.get().strip()
+            if serverURL:
+                runJob(serverURL, "download", inputPath, self.updateBottomProgress, self.closing.is_set,
+                       changesOnly = self.changesOnlyDownload.get(), index = self.indexDownload.get())
+            else:
+                handleDownload(Path(self.PDFFileEntry.get()), self.updateBottomProgress, self.changesOnlyDownload.get(), self.profileRuns.get(), self.indexDownload.get())
             resultText = f"Successfully saved! Check for PDFs in {parentPath}"
             textColor = "green"
         except PermissionError as pe:
@@ -146,6 +196,35 @@ class PDFHarvestingApp:
         self.updateBottomProgress(resultText = resultText, value = 0, textColor = textColor)
 
 
+    def handleSearch(self):
+        """
+        Search the index built for the PDF file location and list the ranked hits.
+
+        Returns:
+            None
+        """
+        self.searchResults.delete(0, tkinter.END)
+        indexPath = indexPathFor(Path(self.PDFFileEntry.get()))
+        if not indexPath.exists():
+            self.searchResults.insert(tkinter.END, "No search index yet. Save the PDFs first")
+            return
+        try:
+            self.searchHits = searchIndex(indexPath, self.searchEntry.get())
+        except Exception as e:
+            logging.error(f"Search error: {e}")
+            self.searchHits = []
+        for hit in self.searchHits:
+            self.searchResults.insert(tkinter.END, f"{hit['company']} - {hit['title']}: {hit['snippet']}")
+        if not self.searchHits:
+            self.searchResults.insert(tkinter.END, "No matches")
+
+
+    def openSearchHit(self):
+        selection = self.searchResults.curselection()
+        if selection and selection[0] < len(self.searchHits):
+            os.startfile(self.searchHits[selection[0]]['path'])
+
+
     def updateTopProgress(self, resultText, value, textColor = "black"):
         """
         Update the top progress bar and result label in the Tkinter application.
@@ -0,0 +1,65 @@
+from html.parser import HTMLParser
+import codecs
+
+
+class ElementCloseWatcher(HTMLParser):
+    """
+    Incremental HTML parser that notices when the element with a given id has been closed.
+
+    Only the opening and closing tags of the same tag name as the watched element are counted, so void
+    elements and the unclosed <li> tags common on the TA pages do not throw off the nesting depth.
+    """
+
+    def __init__(self, elementId):
+        super().__init__(convert_charrefs = False)
+        self.elementId = elementId
+        self.tagName = None
+        self.depth = 0
+        self.closed = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.closed:
+            return
+        if self.tagName is None:
+            if dict(attrs).get('id') == self.elementId:
+                self.tagName = tag
+                self.depth = 1
+        elif tag == self.tagName:
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        #Self closing tags never change the depth
+        pass
+
+    def handle_endtag(self, tag):
+        if self.tagName is not None and not self.closed and tag == self.tagName:
+            self.depth -= 1
+            if self.depth == 0:
+                self.closed = True
+
+
+def readUntilElementClosed(chunks, elementId, encoding = "utf-8"):
+    """
+    Decode and parse HTML chunks as they arrive, stopping as soon as the given element is closed.
+
+    Parameters:
+    - chunks (iterable): The raw response body in byte chunks.
+    - elementId (str): The id of the element that ends the part of the page we need.
+    - encoding (str, optional): Character encoding of the response. Default is utf-8.
+
+    Returns:
+    - tuple: The HTML read so far (str), the number of bytes consumed (int), and whether the element was closed (bool).
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors = "replace")
+    watcher = ElementCloseWatcher(elementId)
+    parts = []
+    bytesRead = 0
+    for chunk in chunks:
+        bytesRead += len(chunk)
+        text = decoder.decode(chunk)
+        parts.append(text)
+        watcher.feed(text)
+        if watcher.closed:
+            return "".join(parts), bytesRead, True
+    parts.append(decoder.decode(b"", final = True))
+    return "".join(parts), bytesRead, False
@@ -0,0 +1,101 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import logging
+import socket
+import threading
+import time
+
+
+#Shared settings for every HTTP request made by the scraper and the downloader
+TIMEOUT = (10, 30)
+POOL_SIZE = 100
+CONNECT_RETRIES = 2
+DNS_CACHE_SECONDS = 300
+HEADERS = {
+    'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) PDFHarvestingApp",
+    'Accept-Encoding': "gzip, deflate",
+    'Connection': "keep-alive",
+}
+#Example: {'https': "http://proxy.example.com:8080"}.  None uses the HTTP(S)_PROXY environment variables
+PROXIES = None
+
+
+_session = None
+_sessionLock = threading.Lock()
+_dnsCache = {}
+_dnsLock = threading.Lock()
+_originalGetaddrinfo = socket.getaddrinfo
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    Connection pooling adapter that applies the shared timeout to requests that do not set their own.
+    """
+
+    def __init__(self, *args, timeout = TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def cachedGetaddrinfo(host, port, *args, **kwargs):
+    """
+    Drop in replacement for socket.getaddrinfo that remembers each lookup for DNS_CACHE_SECONDS.
+    """
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    with _dnsLock:
+        cached = _dnsCache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    result = _originalGetaddrinfo(host, port, *args, **kwargs)
+    with _dnsLock:
+        _dnsCache[key] = (now + DNS_CACHE_SECONDS, result)
+    return result
+
+
+def installDnsCache():
+    """
+    Route every lookup in the process through the DNS cache.  Safe to call more than once.
+    """
+    if socket.getaddrinfo is not cachedGetaddrinfo:
+        socket.getaddrinfo = cachedGetaddrinfo
+
+
+def createSession():
+    """
+    Create a requests.Session with the shared pooling, keep-alive, compression, retry, header and proxy settings.
+
+    Connection errors are retried by the adapter before any bytes are sent; read errors and bad statuses are
+    left to the callers, which already retry with backoff.
+
+    Returns:
+    - requests.Session: The configured session.
+    """
+    installDnsCache()
+    session = requests.Session()
+    retries = Retry(connect = CONNECT_RETRIES, read = 0, status = 0, other = 0, backoff_factor = 0.5)
+    adapter = TimeoutHTTPAdapter(pool_connections = POOL_SIZE, pool_maxsize = POOL_SIZE, max_retries = retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    if PROXIES:
+        session.proxies.update(PROXIES)
+    return session
+
+
+def getSession():
+    """
+    Return the process wide session shared by the scrape and download phases, creating it on first use.
+    """
+    global _session
+    with _sessionLock:
+        if _session is None:
+            _session = createSession()
+            logging.info("Created shared HTTP session")
+        return _session
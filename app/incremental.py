@@ -0,0 +1,131 @@
+from app.workbook import companyLookupFormulas, companyNameFromCell, readSheetFormulas, COMPANY_ID_COLUMN
+from app.urls import resourceKey
+import pandas as pd
+import logging
+
+
+CHANGES_SHEET = 'Changes'
+ADDED = "Added"
+REMOVED = "Removed"
+
+
+def loadPreviousOutput(outputPath):
+    """
+    Load the Companies and PDFs sheets of a previous run, keeping the analysts' edits and formulas.
+
+    Parameters:
+    - outputPath (Path): Path to the previous _ScrapedPDFs.xlsx file.
+
+    Returns:
+    - tuple or None: (dfCompany, dfPDF), or None if there is no usable previous output.
+    """
+    if not outputPath.exists():
+        return None
+    dfCompany = readSheetFormulas(outputPath, 'Companies')
+    dfPDF = readSheetFormulas(outputPath, 'PDFs')
+    if dfCompany is None or dfPDF is None or 'Company' not in dfCompany.columns or 'PDF URL' not in dfPDF.columns:
+        logging.warning(f"{outputPath} is not a previous scrape output. Running a full save instead")
+        return None
+    return dfCompany, dfPDF
+
+
+def diffCompanies(companies, dfCompanyOld, dfPDFOld):
+    """
+    Diff the freshly scraped companies against the previous output by PDF URL.  URLs are compared in
+    canonical form, so a PDF whose link is written differently than in the previous output is not reported.
+
+    Rows of the previous output are kept as they are (including the hand-edited Assets and Plan Participants
+    values and any hyperlink columns), PDFs that are new are appended, and PDFs that disappeared from a
+    company's page are removed.  Companies an analyst deleted from the Companies sheet are not added back,
+    and companies that were not scraped this run (for example because their page failed to load) are left
+    untouched rather than treated as removed.
+
+    Parameters:
+    - companies (list): List of freshly scraped Company objects.
+    - dfCompanyOld (DataFrame): The previous Companies sheet.
+    - dfPDFOld (DataFrame): The previous PDFs sheet.
+
+    Returns:
+    - tuple: The new Companies sheet, the new PDFs sheet and the change report, as DataFrames.
+    """
+    oldCompanyNames = dfPDFOld['Company'].map(companyNameFromCell)
+    oldURLKeys = dfPDFOld['PDF URL'].map(resourceKey)
+    oldKeys = set(zip(oldCompanyNames, oldURLKeys))
+    seenCompanies = set(oldCompanyNames.dropna()) | set(dfCompanyOld['Company'].dropna())
+
+    scrapedNames = {company.name for company in companies}
+    newRecords = [(company.name, pdf.title, pdf.url, pdf.source) for company in companies for pdf in company.pdfs]
+    newKeys = {(name, resourceKey(url)) for name, title, url, source in newRecords}
+
+    removedMask = pd.Series([name in scrapedNames and (name, key) not in newKeys
+                             for name, key in zip(oldCompanyNames, oldURLKeys)], index = dfPDFOld.index, dtype = bool)
+    dfAdded = pd.DataFrame([record for record in newRecords if (record[0], resourceKey(record[2])) not in oldKeys],
+                           columns = ['Company', 'PDF Title', 'PDF URL', 'Source'])
+    dfRemoved = dfPDFOld[removedMask]
+
+    newCompanyNames = sorted(scrapedNames - seenCompanies)
+    dfNewCompanies = pd.DataFrame({'Company': newCompanyNames, 'Assets': 0, 'Plan Participants': 0})
+    dfCompany = pd.concat([dfCompanyOld, dfNewCompanies], ignore_index = True)
+
+    #Renumber the companies in row order so the Company ID lookup range stays sorted, then rebuild every PDF formula
+    companyIds = pd.RangeIndex(1, len(dfCompany) + 1)
+    if COMPANY_ID_COLUMN in dfCompany.columns:
+        dfCompany[COMPANY_ID_COLUMN] = companyIds
+    else:
+        dfCompany.insert(min(3, len(dfCompany.columns)), COMPANY_ID_COLUMN, companyIds)
+    idOfCompany = dict(zip(dfCompany['Company'], dfCompany[COMPANY_ID_COLUMN]))
+
+    pdfCompanyNames = pd.concat([oldCompanyNames[~removedMask], dfAdded['Company']], ignore_index = True)
+    dfPDF = pd.concat([dfPDFOld[~removedMask], dfAdded], ignore_index = True)
+    pdfCompanyIds = pdfCompanyNames.map(idOfCompany).astype("Int64")
+    if COMPANY_ID_COLUMN in dfPDF.columns:
+        dfPDF[COMPANY_ID_COLUMN] = pdfCompanyIds
+    else:
+        dfPDF.insert(1, COMPANY_ID_COLUMN, pdfCompanyIds)
+    dfPDF['Company'] = companyLookupFormulas(pdfCompanyNames, pdfCompanyIds, dfCompany)
+
+    dfChanges = pd.concat([
+        dfAdded[['Company', 'PDF Title', 'PDF URL']].assign(Change = ADDED),
+        pd.DataFrame({'Company': oldCompanyNames[removedMask], 'PDF Title': dfRemoved['PDF Title'],
+                      'PDF URL': dfRemoved['PDF URL'], 'Change': REMOVED})
+    ], ignore_index = True)[['Change', 'Company', 'PDF Title', 'PDF URL']]
+
+    logging.info(f"Incremental scrape: {len(dfAdded)} PDFs added, {len(dfRemoved)} removed, {len(newCompanyNames)} new companies")
+    return dfCompany, dfPDF, dfChanges
+
+
+def saveChangedCompanyandPDFs(companies, outputPath, previousOutput, progress_callback):
+    """
+    Merge the freshly scraped companies into the previous output and write the change report.
+
+    Parameters:
+    - companies (list): List of freshly scraped Company objects.
+    - outputPath (Path): Path to the output Excel file.
+    - previousOutput (tuple): The (dfCompany, dfPDF) returned by loadPreviousOutput.
+
+    Returns:
+    - DataFrame: The change report that was written to the Changes sheet.
+    """
+    progress_callback("Comparing with previous scrape...", 50)
+    dfCompany, dfPDF, dfChanges = diffCompanies(companies, *previousOutput)
+
+    try:
+        with pd.ExcelWriter(outputPath, engine='openpyxl') as writer:
+            dfCompany.to_excel(writer, sheet_name='Companies', index = False)
+            dfPDF.to_excel(writer, sheet_name= 'PDFs', index=False)
+            dfChanges.to_excel(writer, sheet_name= CHANGES_SHEET, index=False)
+    except Exception as e:
+        logging.error(e)
+        raise e
+    return dfChanges
+
+
+def readAddedURLs(inputPath):
+    """
+    Return the PDF URLs the last incremental scrape added, or None if the workbook has no change report.
+    """
+    with pd.ExcelFile(inputPath, engine='openpyxl') as xls:
+        if CHANGES_SHEET not in xls.sheet_names:
+            return None
+        dfChanges = pd.read_excel(xls, sheet_name = CHANGES_SHEET)
+    return set(dfChanges.loc[dfChanges['Change'] == ADDED, 'PDF URL'])
@@ -0,0 +1,136 @@
+from app.httpclient import TIMEOUT, POOL_SIZE
+from app.profiling import trackThread
+from collections import deque
+from urllib.parse import urlsplit
+import concurrent.futures
+import logging
+import threading
+
+
+#Latency samples kept per host, and how many are needed before the timeouts adapt
+LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+#Timeouts are this multiple of the host's p99 latency, kept between MIN_TIMEOUT and TIMEOUT
+TIMEOUT_MULTIPLIER = 4
+MIN_TIMEOUT = (3, 5)
+#Send a second copy of a request still running after the host's p95 latency
+HEDGE_REQUESTS = True
+HEDGE_PERCENTILE = 95
+#Hedged copies may add at most this fraction of extra requests (plus HEDGE_BURST to start with)
+HEDGE_BUDGET = 0.05
+HEDGE_BURST = 2
+
+
+_hedgeExecutor = concurrent.futures.ThreadPoolExecutor(max_workers = POOL_SIZE, thread_name_prefix = "hedge")
+
+
+def hostOf(url):
+    return (urlsplit(url).hostname or "").lower()
+
+
+class LatencyTracker:
+    """
+    Keeps the recent response times of each host and derives timeouts and hedging delays from them.
+
+    Parameters:
+    - window (int, optional): Samples kept per host.
+    - minSamples (int, optional): Samples needed before a host's percentiles are used.
+    - hedgeBudget (float, optional): Hedged requests allowed per request made.
+    """
+
+    def __init__(self, window = LATENCY_WINDOW, minSamples = MIN_LATENCY_SAMPLES, hedgeBudget = HEDGE_BUDGET):
+        self.window = window
+        self.minSamples = minSamples
+        self.hedgeBudget = hedgeBudget
+        self.samples = {}
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record(self, url, seconds):
+        host = hostOf(url)
+        with self.lock:
+            if host not in self.samples:
+                self.samples[host] = deque(maxlen = self.window)
+            self.samples[host].append(seconds)
+
+    def percentile(self, url, percent):
+        """
+        Return the host's latency percentile in seconds, or None until enough requests were timed.
+        """
+        with self.lock:
+            samples = sorted(self.samples.get(hostOf(url), ()))
+        if len(samples) < self.minSamples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def timeoutFor(self, url):
+        """
+        Return the (connect, read) timeout for a request, TIMEOUT_MULTIPLIER times the host's p99 latency
+        bounded by MIN_TIMEOUT and TIMEOUT.  Hosts without enough samples get TIMEOUT.
+        """
+        p99 = self.percentile(url, 99)
+        if p99 is None:
+            return TIMEOUT
+        return tuple(min(maximum, max(minimum, p99 * TIMEOUT_MULTIPLIER)) for minimum, maximum in zip(MIN_TIMEOUT, TIMEOUT))
+
+    def countRequest(self):
+        with self.lock:
+            self.requests += 1
+
+    def allowHedge(self):
+        """
+        Take one hedge from the budget, or return False if the budget is spent.
+        """
+        with self.lock:
+            if self.hedges >= self.requests * self.hedgeBudget + HEDGE_BURST:
+                return False
+            self.hedges += 1
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'hedges': self.hedges, 'hosts': len(self.samples)}
+
+
+latencyTracker = LatencyTracker()
+
+
+def hedgedCall(func, url, tracker = None):
+    """
+    Call func, and if it is still running after the host's p95 latency call it a second time in parallel.
+    The first copy to succeed wins; the other is left to finish in the background and its result dropped.
+
+    Parameters:
+    - func (function): Makes the request and returns its result. Must be safe to run twice at once.
+    - url (str): The URL requested, whose host's latency sets the delay.
+    - tracker (LatencyTracker, optional): Defaults to the shared latencyTracker.
+
+    Returns:
+    - The result of whichever copy succeeded first.
+
+    Raises:
+    - The exception of the last copy to fail, if both failed.
+    """
+    tracker = tracker or latencyTracker
+    tracker.countRequest()
+    delay = tracker.percentile(url, HEDGE_PERCENTILE) if HEDGE_REQUESTS else None
+    if delay is None:
+        return func()
+
+    #The copies run on the hedge threads, so they are profiled like the pool tasks that call hedgedCall
+    func = trackThread(func)
+    primary = _hedgeExecutor.submit(func)
+    done, _ = concurrent.futures.wait([primary], timeout = delay)
+    if done or not tracker.allowHedge():
+        return primary.result()
+
+    logging.info(f"{url} is slower than {delay:.2f}s. Sending a hedged request")
+    pending = {primary, _hedgeExecutor.submit(func)}
+    while True:
+        done, pending = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+        if not pending:
+            raise next(iter(done)).exception()
@@ -0,0 +1,86 @@
+from pathlib import Path
+import logging
+import os
+
+
+#Characters Windows does not allow in file names, plus control characters
+INVALID_CHARACTERS = r'[<>:"/\\|?*\x00-\x1f]'
+RESERVED_NAMES = r'(?i)^(CON|PRN|AUX|NUL|COM[1-9]|LPT[1-9])$'
+MAX_NAME_LENGTH = 150
+
+
+def sanitizeNames(names, default = "Untitled PDF"):
+    """
+    Turn a Series of PDF titles or company names into valid Windows file names in a single vectorized pass.
+
+    Parameters:
+    - names (Series): The raw names.  Missing values are kept as missing.
+    - default (str, optional): Name used when nothing is left after sanitizing.
+
+    Returns:
+    - Series: The sanitized names.
+    """
+    cleaned = (names.astype("string")
+               .str.replace("/", "-", regex = False)
+               .str.replace(INVALID_CHARACTERS, "", regex = True)
+               .str.replace(r"\s+", " ", regex = True)
+               .str.strip()
+               .str.rstrip(". ")
+               .str.slice(0, MAX_NAME_LENGTH)
+               .str.strip())
+    cleaned = cleaned.mask(cleaned.str.match(RESERVED_NAMES, na = False), "_" + cleaned)
+    cleaned = cleaned.mask(cleaned.notna() & (cleaned == ""), default)
+    return cleaned.astype(object).where(names.notna())
+
+
+def planTargetPaths(dfPDF, rootDirectory, assignedPaths = None):
+    """
+    Compute the local file path of every PDF up front and create each company folder once.
+
+    Titles that collide within a company (compared case-insensitively, as Windows does) get the first
+    free " (2)", " (3)", ... suffix so no two downloads write to the same file.  Rows that already have a
+    file from an earlier run keep it, and no other row is given that file's name.
+
+    Parameters:
+    - dfPDF (DataFrame): The PDFs sheet with 'Company' and 'PDF Title' columns.
+    - rootDirectory (Path): Directory the company folders are created in.
+    - assignedPaths (Series, optional): The file each row was saved to by an earlier run, or missing.
+
+    Returns:
+    - Series: The target path of each row, or missing where the row's company was removed.
+    """
+    companyFolders = sanitizeNames(dfPDF['Company'], default = "Unnamed Company")
+    titles = sanitizeNames(dfPDF['PDF Title'].fillna(""))
+    folderKeys = companyFolders.str.lower()
+    titleKeys = titles.str.lower()
+
+    assigned = assignedPaths.reindex(dfPDF.index) if assignedPaths is not None else titles.map(lambda title: None)
+    keep = assigned.map(lambda path: isinstance(path, str)) & companyFolders.notna()
+    takenNames = {(Path(path).parent.name.lower(), Path(path).stem.lower()) for path in assigned[keep]}
+
+    #A title keeps its own name the first time it appears in a folder, unless an earlier run's file has it
+    free = companyFolders.notna() & ~keep
+    duplicateNumber = titleKeys[free].groupby([folderKeys[free], titleKeys[free]]).cumcount()
+    ownNames = {row for row in duplicateNumber.index[duplicateNumber == 0] if (folderKeys[row], titleKeys[row]) not in takenNames}
+    usedNames = takenNames | {(folderKeys[row], titleKeys[row]) for row in ownNames}
+
+    #A suffixed name can match another title in the folder (a second "Plan" next to "Plan (2)"), so keep
+    #counting until the name is unused
+    fileNames = titles.copy()
+    for row in duplicateNumber.index:
+        if row in ownNames:
+            continue
+        counter = max(duplicateNumber[row] + 1, 2)
+        while (folderKeys[row], f"{titleKeys[row]} ({counter})") in usedNames:
+            counter += 1
+        usedNames.add((folderKeys[row], f"{titleKeys[row]} ({counter})"))
+        fileNames[row] = f"{titles[row]} ({counter})"
+
+    root = str(rootDirectory)
+    targetPaths = (root + os.sep + companyFolders + os.sep + fileNames + ".pdf").where(companyFolders.notna())
+    targetPaths[keep] = assigned[keep]
+
+    for folder in companyFolders.dropna().unique():
+        Path(root, folder).mkdir(parents = True, exist_ok = True)
+    logging.info(f"Planned {targetPaths.notna().sum()} target paths in {companyFolders.nunique()} company folders")
+    return targetPaths
@@ -0,0 +1,104 @@
+from app.scraper import INVALID_PAGE_ERROR, NO_DOCUMENTS_ERROR
+from app.urls import resourceKey
+from urllib.parse import urlsplit
+import pandas as pd
+import logging
+
+
+BLANK_URL_ERROR = "No URL in this row"
+MALFORMED_URL_ERROR = "This is not a valid web address"
+
+
+def isValidURL(value):
+    """
+    Return True if a URL cell holds an absolute http(s) address that can be fetched.
+    """
+    if not isinstance(value, str):
+        return False
+    try:
+        parts = urlsplit(value.strip())
+        parts.port
+    except ValueError:
+        return False
+    return parts.scheme.lower() in ("http", "https") and bool(parts.hostname) and " " not in parts.netloc
+
+
+def retryableRows(df):
+    """
+    Return a mask of the rows a failures-only re-run should scrape again.
+
+    Rows that were scraped successfully ("True") or whose page is not a TA page or has no Plan Documents
+    will give the same answer again, so only rows with fetch errors, an interrupted run or no status yet
+    are retried.
+
+    Parameters:
+    - df (DataFrame): A sheet of the TA URL file.
+
+    Returns:
+    - Series: True for each row to scrape again.
+    """
+    if 'Active' not in df.columns:
+        return pd.Series(True, index = df.index)
+    status = df['Active'].astype(str)
+    return ~status.isin(["True", INVALID_PAGE_ERROR, NO_DOCUMENTS_ERROR])
+
+
+def preflightURLs(sheets, failuresOnly = False):
+    """
+    Work out the unique scrape workload of a TA URL file before anything is fetched.
+
+    Blank and malformed URL cells get their Active status straight away instead of going through the
+    fetch and retry path.  Every other URL is grouped with the rows, on any sheet, that list the same page
+    under any form of its URL, so each page is scraped once and its result written to all of them.
+
+    Parameters:
+    - sheets (dict): Maps each sheet name to its DataFrame. The Active columns are updated in place.
+    - failuresOnly (bool, optional): Only schedule the rows retryableRows selects.
+
+    Returns:
+    - tuple: (uniqueURLs, rowsOfURL, report)
+      - uniqueURLs (dict): Maps each resource key to the URL to fetch for it.
+      - rowsOfURL (dict): Maps each resource key to {sheet name: [row labels]} of the rows that list it.
+      - report (dict): Row counts: rows, blank, malformed, skipped, scheduled, unique and duplicates.
+    """
+    uniqueURLs = {}
+    rowsOfURL = {}
+    report = dict.fromkeys(['rows', 'blank', 'malformed', 'skipped', 'scheduled'], 0)
+
+    for sheetName, df in sheets.items():
+        text = df['URL'].map(lambda value: value.strip() if isinstance(value, str) else value)
+        blank = text.isna() | text.eq("")
+        valid = text.map(isValidURL).astype(bool)
+        malformed = ~blank & ~valid
+        toScrape = valid & retryableRows(df) if failuresOnly else valid
+
+        #Give every sheet an object Active column up front, as the scrape threads write into it concurrently
+        df['Active'] = df['Active'].astype(object) if 'Active' in df.columns else pd.Series(None, index = df.index, dtype = object)
+        df.loc[blank, 'Active'] = BLANK_URL_ERROR
+        df.loc[malformed, 'Active'] = MALFORMED_URL_ERROR
+
+        for row, url in text[toScrape].items():
+            key = resourceKey(url)
+            uniqueURLs.setdefault(key, url)
+            rowsOfURL.setdefault(key, {}).setdefault(sheetName, []).append(row)
+
+        report['rows'] += len(df)
+        report['blank'] += int(blank.sum())
+        report['malformed'] += int(malformed.sum())
+        report['skipped'] += int((valid & ~toScrape).sum())
+        report['scheduled'] += int(toScrape.sum())
+
+    report['unique'] = len(uniqueURLs)
+    report['duplicates'] = report['scheduled'] - report['unique']
+    logging.info(f"Pre-flight: {report}")
+    return uniqueURLs, rowsOfURL, report
+
+
+def describeWorkload(report):
+    """
+    Return a one line summary of a pre-flight report for the progress label.
+    """
+    details = [f"{report['duplicates']} duplicates", f"{report['blank']} blank", f"{report['malformed']} invalid"]
+    if report['skipped']:
+        details.append(f"{report['skipped']} already scraped")
+    return f"Scraping {report['unique']} unique URLs for {report['rows']} rows ({', '.join(details)})"
@@ -0,0 +1,204 @@
+from pathlib import Path
+import contextlib
+import cProfile
+import csv
+import functools
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+SAMPLE_INTERVAL = 0.01
+TOP_ALLOCATIONS = 25
+
+activeProfiler = None
+
+
+class RunProfiler:
+    """
+    Collects profiling data for one scrape or download run and writes it next to the workbook.
+
+    For every stage it writes:
+    - <stage>.prof: cProfile stats of the stage, including the pool threads. Loads in snakeviz or flameprof.
+    - <stage>.folded: stack samples of every thread in collapsed format, for flamegraph.pl or speedscope.
+    - <stage>_memory.snapshot / <stage>_memory.txt: a tracemalloc snapshot taken when the stage ends.
+    For the whole run it writes threads.csv with the wall and CPU time of each worker thread, which shows
+    whether the threads were waiting on the network or competing for the GIL.
+
+    Parameters:
+    - outputDirectory (Path): Directory the profile files are written to.
+    """
+
+    def __init__(self, outputDirectory):
+        self.outputDirectory = Path(outputDirectory)
+        self.outputDirectory.mkdir(parents = True, exist_ok = True)
+        self.lock = threading.Lock()
+        self.threadTimes = {}
+        #Thread profiles collected for each stage that is running, innermost stage last
+        self.stageThreadProfiles = []
+
+    def start(self):
+        tracemalloc.start()
+
+    def stop(self):
+        tracemalloc.stop()
+        with open(self.outputDirectory / "threads.csv", "w", newline = "") as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(["Thread", "Calls", "Wall Seconds", "CPU Seconds", "CPU / Wall"])
+            for threadName, (calls, wall, cpu) in sorted(self.threadTimes.items()):
+                writer.writerow([threadName, calls, round(wall, 4), round(cpu, 4), round(cpu / wall, 4) if wall else 0])
+        logging.info(f"Profile written to {self.outputDirectory}")
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Profile everything that runs until the block exits as one stage.
+        """
+        logging.info(f"Profiling stage {name}")
+        profile = cProfile.Profile()
+        threadProfiles = []
+        with self.lock:
+            self.stageThreadProfiles.append(threadProfiles)
+        samples = {}
+        stopSampling = threading.Event()
+        sampler = threading.Thread(target = self.sample, args = (samples, stopSampling), daemon = True)
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            stopSampling.set()
+            sampler.join()
+            with self.lock:
+                self.stageThreadProfiles.remove(threadProfiles)
+            stats = pstats.Stats(profile)
+            for threadProfile in threadProfiles:
+                stats.add(threadProfile)
+            stats.dump_stats(str(self.outputDirectory / f"{name}.prof"))
+            self.writeFolded(name, samples)
+            self.snapshotMemory(name)
+
+    def sample(self, samples, stopSampling):
+        """
+        Record the stack of every other thread every SAMPLE_INTERVAL seconds until the stage ends.
+        """
+        ownId = threading.get_ident()
+        while not stopSampling.wait(SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for threadId, frame in sys._current_frames().items():
+                if threadId == ownId:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join([names.get(threadId, str(threadId))] + stack[::-1])
+                samples[key] = samples.get(key, 0) + 1
+
+    def writeFolded(self, name, samples):
+        with open(self.outputDirectory / f"{name}.folded", "w", encoding = "utf-8") as foldedFile:
+            for stack, count in samples.items():
+                foldedFile.write(f"{stack} {count}\n")
+
+    def snapshotMemory(self, name):
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(str(self.outputDirectory / f"{name}_memory.snapshot"))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(self.outputDirectory / f"{name}_memory.txt", "w", encoding = "utf-8") as memoryFile:
+            memoryFile.write(f"Current: {current / 1e6:.1f} MB  Peak: {peak / 1e6:.1f} MB\n\n")
+            for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                memoryFile.write(f"{statistic}\n")
+
+    def runInThread(self, func, *args, **kwargs):
+        """
+        Run a pool task under its own cProfile (cProfile only sees the thread that enabled it) and record
+        the thread's wall and CPU time.
+        """
+        profile = cProfile.Profile()
+        wallStart, cpuStart = time.perf_counter(), time.thread_time()
+        try:
+            profile.enable()
+        except ValueError:
+            #Python versions that allow only one active cProfile at a time still get the thread times
+            profile = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall, cpu = time.perf_counter() - wallStart, time.thread_time() - cpuStart
+            threadName = threading.current_thread().name
+            with self.lock:
+                calls, totalWall, totalCpu = self.threadTimes.get(threadName, (0, 0, 0))
+                self.threadTimes[threadName] = (calls + 1, totalWall + wall, totalCpu + cpu)
+                if profile is not None and self.stageThreadProfiles:
+                    self.stageThreadProfiles[-1].append(profile)
+
+
+def startProfiling(outputDirectory):
+    """
+    Turn profiling on for the run that is about to start.
+    """
+    global activeProfiler
+    activeProfiler = RunProfiler(outputDirectory)
+    activeProfiler.start()
+    return activeProfiler
+
+
+def stopProfiling():
+    global activeProfiler
+    if activeProfiler is not None:
+        activeProfiler.stop()
+        activeProfiler = None
+
+
+def stage(name):
+    """
+    Mark a stage of the run.  Does nothing unless profiling is on.  Stages must not be nested, as each one
+    runs its own cProfile profiler and only one can be active at a time.
+    """
+    if activeProfiler is None:
+        return contextlib.nullcontext()
+    return activeProfiler.stage(name)
+
+
+def trackThread(func):
+    """
+    Wrap a function submitted to a thread pool so its thread time is profiled when profiling is on.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = activeProfiler
+        if profiler is None:
+            return func(*args, **kwargs)
+        return profiler.runInThread(func, *args, **kwargs)
+    return wrapper
+
+
+def profileDirectoryFor(inputPath, runName):
+    """
+    Return the directory a profiled run of a workbook is written to, e.g. files_profile_scrape_20240101-120000.
+    """
+    return inputPath.parent / Path(f"{inputPath.stem}_profile_{runName}_{time.strftime('%Y%m%d-%H%M%S')}")
+
+
+def profiledRun(outputDirectory, enabled):
+    """
+    Context manager that profiles the block when enabled is True.
+    """
+    if not enabled:
+        return contextlib.nullcontext()
+
+    @contextlib.contextmanager
+    def run():
+        startProfiling(outputDirectory)
+        try:
+            yield
+        finally:
+            stopProfiling()
+    return run()
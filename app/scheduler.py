@@ -0,0 +1,139 @@
+from urllib.parse import urlsplit
+from app.urls import getRedirectCache
+import concurrent.futures
+import logging
+import statistics
+import threading
+import time
+
+
+#Global download bandwidth cap in bytes per second.  None means uncapped
+MAX_BYTES_PER_SECOND = None
+MAX_CONNECTIONS_PER_HOST = 8
+CHUNK_SIZE = 64 * 1024
+#HEAD probes only decide the download order, so a slow server is not waited on for long
+HEAD_TIMEOUT = (3, 5)
+
+
+def savedContentLength(response):
+    """
+    Return the Content-Length of a response as the number of bytes the saved file will have, or None.
+
+    A compressed response's Content-Length is the size on the wire, not the size of the saved file.
+    """
+    contentLength = response.headers.get('Content-Length')
+    if not contentLength or response.headers.get('Content-Encoding'):
+        return None
+    return int(contentLength)
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket shared by every download thread to enforce a global bandwidth cap.
+    """
+
+    def __init__(self, rate, burst = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        Block until amount bytes may be transferred without exceeding the rate.
+        """
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            #Take the tokens now, even going negative, so waiting threads queue up behind each other
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DownloadScheduler:
+    """
+    Orders downloads by size and enforces the bandwidth and per-host connection limits while they run.
+
+    Transfers are started largest first (longest processing time first), so the few huge documents no
+    longer start at the end of the run and form a long tail; the small files fill in the remaining
+    threads around them.
+
+    Parameters:
+    - maxBytesPerSecond (int, optional): Global bandwidth cap shared by every transfer. None means uncapped.
+    - maxConnectionsPerHost (int, optional): Maximum simultaneous transfers to a single host.
+    """
+
+    def __init__(self, maxBytesPerSecond = MAX_BYTES_PER_SECOND, maxConnectionsPerHost = MAX_CONNECTIONS_PER_HOST):
+        self.bandwidth = TokenBucket(maxBytesPerSecond, burst = max(maxBytesPerSecond or 0, CHUNK_SIZE)) if maxBytesPerSecond else None
+        self.maxConnectionsPerHost = maxConnectionsPerHost
+        self.hostSlots = {}
+        self.lock = threading.Lock()
+
+    def probeSizes(self, urls, session, knownSizes = None, maxWorkers = 32):
+        """
+        Find the size of each URL, from the previous download manifest if there is one and otherwise with
+        HEAD requests.
+
+        When a manifest is given, the URLs it has no size for are not probed; order treats them as median
+        sized.  The HEAD requests do not take a per-host connection slot, so they never hold back downloads.
+
+        Parameters:
+        - urls (iterable): The PDF URLs to size.
+        - session (requests.Session): Session used for the HEAD requests.
+        - knownSizes (dict, optional): Sizes recorded by the previous run, from the Size column.
+
+        Returns:
+        - dict: Maps each URL to its size in bytes, or None if the server did not report one.
+        """
+        #Skip blank manifest entries (NaN compares unequal to itself)
+        sizes = {url: int(size) for url, size in (knownSizes or {}).items() if size and size == size}
+        toProbe = [url for url in set(urls) if url not in sizes] if knownSizes is None else []
+
+        redirects = getRedirectCache() if toProbe else None
+
+        def head(url):
+            try:
+                targetURL = redirects.resolve(url)
+                response = session.head(targetURL, allow_redirects = True, timeout = HEAD_TIMEOUT)
+                redirects.recordResponse(url, response)
+                return url, savedContentLength(response) if response.ok else None
+            except Exception as e:
+                logging.debug(f"HEAD {url} failed: {e}")
+                return url, None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+            for url, size in executor.map(head, toProbe):
+                sizes[url] = size
+        logging.info(f"Sized {len(sizes)} downloads ({len(toProbe)} HEAD requests)")
+        return sizes
+
+    def order(self, jobs, sizes, urlOf = lambda job: job[0]):
+        """
+        Return the jobs sorted largest first.  Jobs of unknown size are treated as median sized.
+        """
+        known = [size for size in sizes.values() if size]
+        estimate = statistics.median(known) if known else 0
+        return sorted(jobs, key = lambda job: sizes.get(urlOf(job)) or estimate, reverse = True)
+
+    def hostSlot(self, url):
+        """
+        Return the semaphore limiting the simultaneous connections to the URL's host.
+        """
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.hostSlots:
+                self.hostSlots[host] = threading.BoundedSemaphore(self.maxConnectionsPerHost)
+            return self.hostSlots[host]
+
+    def throttle(self, amount):
+        """
+        Account for amount bytes against the global bandwidth cap, sleeping if it has been reached.
+        """
+        if self.bandwidth is not None:
+            self.bandwidth.consume(amount)
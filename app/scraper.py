@@ -2,6 +2,11 @@ from xml.etree.ElementTree import TreeBuilder
 from bs4 import BeautifulSoup
 from classes.Company import Company
 from classes.PDF import PDF
+from app.htmlstream import readUntilElementClosed
+from app.latency import latencyTracker, hedgedCall
+from app.httpclient import TIMEOUT
+from app.cache import SingleFlightCache
+from app.urls import resourceKey, getRedirectCache
 import requests 
 import re
 import logging
@@ -9,18 +14,83 @@ import time
 
 
 MAX_RETRIES = 3
+STREAM_HTML = True
+STREAM_CHUNK_SIZE = 16 * 1024
+#Decompressed bytes after #planDocuments read off the connection so it can be reused (see readPageData)
+MAX_DRAIN_BYTES = 256 * 1024
+PLAN_DOCUMENTS_ID = 'planDocuments'
+INVALID_PAGE_ERROR = "This page does not appear to be a valid TA Page"
+NO_DOCUMENTS_ERROR = "This page does not contain any Plan Documents"
 stop_flag = False
+#Set by enablePageCache when several jobs share this process (see app.server)
+pageCache = None
 
 
-def fetchDataFromURL(url, session, max_retries = MAX_RETRIES):
+def readPageData(pageData, stream):
+    """
+    Return the HTML of a response, reading only up to the end of the planDocuments block when streaming.
+
+    Everything the scraper needs (title, company name, account table and plan documents) comes before the
+    end of #planDocuments, so the fund tables, scripts and footer after it are never decoded or parsed.
+    """
+    if not stream:
+        return pageData.text
+    try:
+        chunks = pageData.iter_content(STREAM_CHUNK_SIZE)
+        html, bytesRead, closed = readUntilElementClosed(chunks, PLAN_DOCUMENTS_ID, pageData.encoding or "utf-8")
+        #Closing a response before its body is read also closes the connection, so the rest of the page
+        #is read and dropped without parsing, to hand the connection back to the pool.  Only a remainder
+        #longer than MAX_DRAIN_BYTES is cut off, as that costs more than a new connection
+        drained = 0
+        if closed:
+            for chunk in chunks:
+                drained += len(chunk)
+                if drained > MAX_DRAIN_BYTES:
+                    break
+        logging.debug(f"Parsed {bytesRead} bytes of {pageData.url} ({'stopped after' if closed else 'no'} {PLAN_DOCUMENTS_ID}), skipped {drained}")
+        return html
+    finally:
+        pageData.close()
+
+
+def fetchPage(url, fetchURL, session, stream, timeout = None):
+    """
+    Make one request for a page and return its HTML, recording the host's latency and any redirect followed.
+
+    A request that times out is recorded at the time it waited, so the timeouts of a host that has slowed
+    down grow again instead of staying at MIN_TIMEOUT.  The timeout defaults to the host's adaptive timeout.
+    """
+    started = time.perf_counter()
+    try:
+        pageData = session.get(fetchURL, timeout = timeout or latencyTracker.timeoutFor(fetchURL), stream = stream)
+    except requests.exceptions.Timeout:
+        latencyTracker.record(fetchURL, time.perf_counter() - started)
+        raise
+    getRedirectCache().recordResponse(url, pageData)
+    try:
+        pageData.raise_for_status()
+    except requests.exceptions.HTTPError:
+        pageData.close()
+        raise
+    html = readPageData(pageData, stream)
+    latencyTracker.record(fetchURL, time.perf_counter() - started)
+    return html
+
+
+def fetchDataFromURL(url, session, max_retries = MAX_RETRIES, stream = STREAM_HTML):
 
     """
     Make an HTTP request to the provided URL and return the HTML response as a string.
 
+    URLs that redirected before are requested at their recorded target, and new redirects are recorded.
+    The first attempt's timeout follows the host's recent latency and retries use the full TIMEOUT.  A
+    request still running after the host's p95 latency is sent a second time (see app.latency.hedgedCall).
+
     Parameters:
     - url (str): The URL to make the HTTP request.
     - session (requests.Session): The requests session to use for the request.
     - max_retries (int): Maximum number of retries in case of failure.
+    - stream (bool): Stop reading the response once the planDocuments block is closed.
 
     Returns:
     - dict: A dictionary with 'data' containing the HTML response text (if successful),
@@ -29,15 +99,19 @@ def fetchDataFromURL(url, session, max_retries = MAX_RETRIES):
 
     if stop_flag:
         return None
+    redirects = getRedirectCache()
+    fetchURL = redirects.resolve(url)
     #Client server has rare breaks in remote end connection, so need to retry in these instances
     for attempt in range(max_retries):
         waitTime = min(2**attempt, 30)
+        #Retries use the full TIMEOUT, in case the adaptive timeout has become too short for the host
+        timeout = TIMEOUT if attempt > 0 else None
         try:
-            pageData = session.get(url, timeout = (30,30))
-            pageData.raise_for_status()
-            return {'data': pageData.text, 'error': None}
+            html = hedgedCall(lambda: fetchPage(url, fetchURL, session, stream, timeout), fetchURL)
+            return {'data': html, 'error': None}
         except requests.exceptions.HTTPError as errh:
             logging.warning(f'HTTP Error on attempt {attempt+1} : {errh}. Failed to fetch data from {url}. ')
+            fetchURL = redirects.retryTarget(url, fetchURL)
         except requests.exceptions.ConnectionError as errc:
             logging.warning(f'Error Connecting on attempt {attempt+1}: {errc}. Failed to fetch data from {url}.')
         except requests.exceptions.Timeout as errt:
@@ -110,7 +184,7 @@ def extractPDFs(company, doc):
       - If there's an error during the extraction, the first element is None, and the second element is an error message.
     """
     try: 
-        planDocsHTML = doc.find(id='planDocuments')
+        planDocsHTML = doc.find(id=PLAN_DOCUMENTS_ID)
         if planDocsHTML:
             pdfAnchors = planDocsHTML.find_all('a')
             for a in pdfAnchors:
@@ -189,6 +263,9 @@ def scrape_pdf_links(homePageUrl, session):
     """
     Scrape PDF links from a TransAmerica (TA) page.
 
+    When the page cache is enabled, a page that was already scraped (or is being scraped by another job),
+    under this or any other form of its URL, is not fetched again.
+
     Parameters:
     - homePageUrl (str): The URL of the TransAmerica home page.
 
@@ -204,7 +281,20 @@ def scrape_pdf_links(homePageUrl, session):
     if stop_flag:
         logging.info("Program was closed")
         return None, f"Program was closed"
-    
+
+    if pageCache is not None:
+        return pageCache.getOrCompute(resourceKey(getRedirectCache().resolve(homePageUrl)), lambda: scrapePage(homePageUrl, session), cacheable = isFinalResult)
+    return scrapePage(homePageUrl, session)
+
+
+def isFinalResult(companyTuple):
+    """
+    Return True if a scrape result will not change on a retry, i.e. it is not a fetch error or an interrupted run.
+    """
+    return companyTuple[0] is not None or companyTuple[1] in (INVALID_PAGE_ERROR, NO_DOCUMENTS_ERROR)
+
+
+def scrapePage(homePageUrl, session):
     logging.info(f"Scraping {homePageUrl}")
     doc = findValidDoc(homePageUrl, session)
     
@@ -221,16 +311,25 @@ def scrape_pdf_links(homePageUrl, session):
             if pdfErrorMessage:
                 return None, pdfErrorMessage
             elif not company.pdfs:
-                return None, "This page does not contain any Plan Documents"
+                return None, NO_DOCUMENTS_ERROR
             else: 
                 return company, None
         else:
             logging.info(f"{homePageUrl} does not appear to be a valid TA page")
-            return None, "This page does not appear to be a valid TA Page"
+            return None, INVALID_PAGE_ERROR
     else:
         return None, f"Error fetching {homePageUrl}"
 
 
+def enablePageCache(ttl):
+    """
+    Share scrape results between jobs for ttl seconds.  Fetch errors are not cached.
+    """
+    global pageCache
+    pageCache = SingleFlightCache(ttl)
+    return pageCache
+
+
 def stopProcessingScraper():
     global stop_flag
     stop_flag = True
\ No newline at end of file
@@ -0,0 +1,279 @@
+from app.workbook import readSheetFormulas, companyNameFromCell, FILE_LINK_REGEX
+from config.logging_config import configure_logging
+from pathlib import Path
+import concurrent.futures
+import argparse
+import hashlib
+import logging
+import re
+import sqlite3
+import zlib
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+STREAM_REGEX = re.compile(rb'stream\r?\n(.*?)\r?\nendstream', re.S)
+TEXT_OPERATOR_REGEX = re.compile(rb'\[((?:\\.|[^\]\\])*)\]\s*TJ|\(((?:\\.|[^)\\])*)\)\s*(?:Tj|\'|")', re.S)
+STRING_REGEX = re.compile(rb'\(((?:\\.|[^)\\])*)\)', re.S)
+ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def indexPathFor(inputPath):
+    """
+    Return the path of the search index that belongs to a scraped PDFs workbook.
+    """
+    return inputPath.parent / Path(f"{inputPath.stem}_SearchIndex.sqlite")
+
+
+##########################################################################
+# Text extraction (runs in worker processes)
+
+
+def unescapePDFString(raw):
+    def replace(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        return ESCAPES.get(escaped, escaped)
+    return re.sub(rb'\\([0-7]{1,3}|.)', replace, raw, flags = re.S)
+
+
+def extractTextFallback(data):
+    """
+    Pull the literal strings out of the text operators of every (Flate compressed or plain) content stream.
+
+    Used when pypdf is not installed.  Text drawn with custom font encodings is not recovered.
+    """
+    parts = []
+    for match in STREAM_REGEX.finditer(data):
+        stream = match.group(1)
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        for array, string in TEXT_OPERATOR_REGEX.findall(stream):
+            strings = STRING_REGEX.findall(array) if array else [string]
+            parts.append(b"".join(unescapePDFString(value) for value in strings))
+    return b" ".join(parts).decode("latin-1")
+
+
+def fileHash(filePath):
+    """
+    Return the SHA-256 of a file, or None if it cannot be read.
+    """
+    sha256 = hashlib.sha256()
+    try:
+        with open(filePath, 'rb') as pdfFile:
+            for chunk in iter(lambda: pdfFile.read(1024 * 1024), b""):
+                sha256.update(chunk)
+    except OSError as e:
+        logging.warning(f"Could not read {filePath}: {e}")
+        return None
+    return sha256.hexdigest()
+
+
+def extractDocument(filePath):
+    """
+    Read a PDF and return its SHA-256 and text.
+
+    Parameters:
+    - filePath (str): Path of the downloaded PDF.
+
+    Returns:
+    - tuple: (filePath, sha256, text), with sha256 and text set to None if the file could not be read.
+    """
+    try:
+        with open(filePath, 'rb') as pdfFile:
+            data = pdfFile.read()
+    except OSError as e:
+        logging.warning(f"Could not read {filePath}: {e}")
+        return filePath, None, None
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    text = None
+    if PdfReader is not None:
+        try:
+            text = "\n".join(page.extract_text() or "" for page in PdfReader(filePath).pages)
+        except Exception as e:
+            logging.warning(f"pypdf could not read {filePath}: {e}")
+    if not text:
+        text = extractTextFallback(data)
+    return filePath, sha256, text
+
+
+##########################################################################
+# Index
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 full-text index of the harvested PDFs, keyed by company, title and URL.
+    """
+
+    def __init__(self, indexPath):
+        self.conn = sqlite3.connect(str(indexPath))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                sha256 TEXT,
+                company TEXT,
+                title TEXT,
+                url TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                company, title, url UNINDEXED, body, tokenize = 'porter unicode61'
+            );""")
+
+    def close(self):
+        self.conn.close()
+
+    def indexedHashes(self):
+        return dict(self.conn.execute("SELECT path, sha256 FROM documents"))
+
+    def add(self, path, sha256, company, title, url, body):
+        """
+        Add or replace the document stored for a file path.
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                self.conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+                self.conn.execute("UPDATE documents SET sha256 = ?, company = ?, title = ?, url = ? WHERE id = ?",
+                                  (sha256, company, title, url, row[0]))
+                documentId = row[0]
+            else:
+                documentId = self.conn.execute("INSERT INTO documents (path, sha256, company, title, url) VALUES (?, ?, ?, ?, ?)",
+                                               (path, sha256, company, title, url)).lastrowid
+            self.conn.execute("INSERT INTO documents_fts (rowid, company, title, url, body) VALUES (?, ?, ?, ?, ?)",
+                              (documentId, company, title, url, body))
+
+    def remove(self, paths):
+        with self.conn:
+            for path in paths:
+                row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    self.conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+                    self.conn.execute("DELETE FROM documents WHERE id = ?", row)
+
+    def search(self, text, limit = 50):
+        """
+        Return the best matching documents for a query, best first.
+
+        Every word of the query must appear in the company, title or text of the document.
+
+        Returns:
+        - list: Dictionaries with the company, title, url, path and a snippet of the matching text.
+        """
+        terms = re.findall(r'\w+', text)
+        if not terms:
+            return []
+        matchQuery = " ".join(f'"{term}"' for term in terms)
+        rows = self.conn.execute("""
+            SELECT documents.company, documents.title, documents.url, documents.path,
+                   snippet(documents_fts, 3, '[', ']', '...', 12)
+            FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY bm25(documents_fts, 5.0, 5.0, 0.0, 1.0)
+            LIMIT ?""", (matchQuery, limit))
+        return [{'company': company, 'title': title, 'url': url, 'path': path, 'snippet': snippet}
+                for company, title, url, path, snippet in rows]
+
+
+def readDownloadedPDFs(inputPath):
+    """
+    Return (path, company, title, url, sha256) for every PDF the workbook links to a local file.
+    """
+    dfPDF = readSheetFormulas(inputPath, 'PDFs')
+    documents = []
+    if dfPDF is None or 'Local FilePath' not in dfPDF.columns:
+        return documents
+    hashes = dfPDF['SHA256'] if 'SHA256' in dfPDF.columns else [None] * len(dfPDF)
+    for company, title, url, link, sha256 in zip(dfPDF['Company'], dfPDF['PDF Title'], dfPDF['PDF URL'], dfPDF['Local FilePath'], hashes):
+        match = re.match(FILE_LINK_REGEX, link) if isinstance(link, str) else None
+        if match and match.group(1) != "null" and Path(match.group(1)).exists():
+            documents.append((match.group(1), companyNameFromCell(company), title, url, sha256 if isinstance(sha256, str) else None))
+    return documents
+
+
+def indexWorkbook(inputPath, progress_callback, indexPath = None):
+    """
+    Extract the text of every downloaded PDF of a workbook in a process pool and load it into the search index.
+
+    Files whose SHA-256 matches the indexed copy are skipped.  The hashes come from the SHA256 column written
+    by the download validation, or are computed here when the column is missing, so only new and changed
+    files are sent to the pool to have their text extracted.
+
+    Parameters:
+    - inputPath (Path): Path to the scraped PDFs Excel file the PDFs were downloaded from.
+    - progress_callback (function): Called with a status message and a percentage.
+    - indexPath (Path, optional): Where to keep the index. Defaults to <input>_SearchIndex.sqlite.
+
+    Returns:
+    - int: The number of documents (re)indexed.
+    """
+    indexPath = indexPath or indexPathFor(inputPath)
+    documents = readDownloadedPDFs(inputPath)
+    index = SearchIndex(indexPath)
+    try:
+        indexed = index.indexedHashes()
+        index.remove(set(indexed) - {document[0] for document in documents})
+        hashes = {document[0]: document[4] or fileHash(document[0]) for document in documents}
+        toExtract = {document[0]: document for document in documents
+                     if hashes[document[0]] is None or indexed.get(document[0]) != hashes[document[0]]}
+        logging.info(f"Indexing {len(toExtract)} of {len(documents)} PDFs into {indexPath}")
+
+        added = 0
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            for count, (path, sha256, text) in enumerate(executor.map(extractDocument, toExtract, chunksize = 8)):
+                progress = (count + 1) / len(toExtract) * 100
+                progress_callback(f"Indexing...{progress}%", progress)
+                if sha256 is None or indexed.get(path) == sha256:
+                    continue
+                _, company, title, url, _ = toExtract[path]
+                index.add(path, sha256, company, title, url, text)
+                added += 1
+        return added
+    finally:
+        index.close()
+
+
+def searchIndex(indexPath, text, limit = 50):
+    """
+    Run a query against a search index file.
+    """
+    index = SearchIndex(indexPath)
+    try:
+        return index.search(text, limit)
+    finally:
+        index.close()
+
+
+##########################################################################
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Full-text search over the harvested PDFs")
+    subparsers = parser.add_subparsers(dest = "mode", required = True)
+    indexParser = subparsers.add_parser("index", help = "Index the downloaded PDFs of a scraped PDFs workbook")
+    indexParser.add_argument("workbook")
+    queryParser = subparsers.add_parser("query", help = "Search the index of a scraped PDFs workbook")
+    queryParser.add_argument("workbook")
+    queryParser.add_argument("text")
+    queryParser.add_argument("--limit", type = int, default = 20)
+    args = parser.parse_args()
+
+    if args.mode == "index":
+        configure_logging(Path("LogFile_index.log"))
+        added = indexWorkbook(Path(args.workbook), lambda text, value: None)
+        print(f"Indexed {added} documents")
+    else:
+        for hit in searchIndex(indexPathFor(Path(args.workbook)), args.text, args.limit):
+            print(f"{hit['company']} - {hit['title']}\n    {hit['path']}\n    {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+from app.backend import handleScraping, handleDownload, enableDownloadCache
+from app.scraper import enablePageCache
+from app.latency import latencyTracker
+from config.logging_config import configure_logging
+from flask import Flask, jsonify, request
+from pathlib import Path
+import concurrent.futures
+import argparse
+import logging
+import threading
+import time
+import uuid
+
+
+DEFAULT_PORT = 5123
+MAX_CONCURRENT_JOBS = 2
+PAGE_CACHE_SECONDS = 6 * 60 * 60
+DOWNLOAD_CACHE_SECONDS = 6 * 60 * 60
+SCRAPE = "scrape"
+DOWNLOAD = "download"
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """
+    Runs scrape and download jobs for several analysts in one process.
+
+    Every job shares the pooled HTTP session, the scrape page cache and the PDF download cache, so a plan
+    page or PDF that one analyst's job fetched is not fetched again for anybody else.  At most
+    MAX_CONCURRENT_JOBS jobs run at once and the rest wait in order.
+
+    Parameters:
+    - maxJobs (int, optional): How many jobs run at the same time.
+    - pageCacheSeconds (int, optional): How long a scraped plan page is reused.
+    - downloadCacheSeconds (int, optional): How long a downloaded PDF is copied instead of fetched again.
+    """
+
+    def __init__(self, maxJobs = MAX_CONCURRENT_JOBS, pageCacheSeconds = PAGE_CACHE_SECONDS, downloadCacheSeconds = DOWNLOAD_CACHE_SECONDS):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = maxJobs, thread_name_prefix = "job")
+        self.pageCache = enablePageCache(pageCacheSeconds)
+        self.downloadCache = enableDownloadCache(downloadCacheSeconds)
+
+    def submit(self, kind, path, options):
+        """
+        Queue a job.
+
+        Returns:
+        - dict: The new job, or None if a job for the same workbook is already queued or running.
+        """
+        inputPath = Path(path)
+        with self.lock:
+            for job in self.jobs.values():
+                if job['path'] == str(inputPath) and job['status'] in (QUEUED, RUNNING):
+                    return None
+            job = {'id': uuid.uuid4().hex, 'kind': kind, 'path': str(inputPath), 'options': options,
+                   'status': QUEUED, 'message': "Queued", 'progress': 0, 'result': None, 'error': None,
+                   'submitted': time.time(), 'finished': None}
+            self.jobs[job['id']] = job
+        self.executor.submit(self.run, job['id'])
+        logging.info(f"Queued {kind} job {job['id']} for {inputPath}")
+        return dict(job)
+
+    def run(self, jobId):
+        job = self.jobs[jobId]
+        inputPath = Path(job['path'])
+        options = job['options']
+
+        def updateProgress(resultText, value):
+            with self.lock:
+                job['message'] = resultText
+                job['progress'] = value
+
+        with self.lock:
+            job['status'] = RUNNING
+        try:
+            if job['kind'] == SCRAPE:
+                handleScraping(inputPath, updateProgress, bool(options.get('incremental', False)),
+                               failuresOnly = bool(options.get('failuresOnly', False)))
+                result = str(inputPath.parent / Path(f"{inputPath.stem}_ScrapedPDFs.xlsx"))
+            else:
+                handleDownload(inputPath, updateProgress, bool(options.get('changesOnly', False)),
+                               index = bool(options.get('index', True)))
+                result = str(inputPath.parent)
+            with self.lock:
+                job.update(status = DONE, progress = 100, message = "Done", result = result)
+        except Exception as e:
+            logging.exception(f"Job {jobId} failed: {e}")
+            with self.lock:
+                job.update(status = FAILED, error = f"{type(e).__name__}: {e}")
+        finally:
+            with self.lock:
+                job['finished'] = time.time()
+
+    def get(self, jobId):
+        with self.lock:
+            job = self.jobs.get(jobId)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def stats(self):
+        return {'pages': self.pageCache.stats(), 'pdfs': self.downloadCache.stats(), 'latency': latencyTracker.stats()}
+
+
+def createApp(manager = None):
+    """
+    Create the Flask app that exposes a JobManager over HTTP.
+
+    Endpoints:
+    - POST /jobs with {"kind": "scrape" or "download", "path": ..., "options": {...}} queues a job.
+    - GET /jobs lists the jobs, GET /jobs/<id> returns one job's status, progress and result.
+    - GET /stats returns the page and PDF cache hit counts and the hedged request count.
+    """
+    manager = manager or JobManager()
+    app = Flask(__name__)
+
+    @app.post("/jobs")
+    def submitJob():
+        body = request.get_json(silent = True) or {}
+        if body.get('kind') not in (SCRAPE, DOWNLOAD) or not body.get('path'):
+            return jsonify(error = "Expected a kind of 'scrape' or 'download' and a workbook path"), 400
+        job = manager.submit(body['kind'], body['path'], body.get('options') or {})
+        if job is None:
+            return jsonify(error = f"A job for {body['path']} is already running"), 409
+        return jsonify(job), 202
+
+    @app.get("/jobs")
+    def listJobs():
+        return jsonify(manager.list())
+
+    @app.get("/jobs/<jobId>")
+    def getJob(jobId):
+        job = manager.get(jobId)
+        if job is None:
+            return jsonify(error = f"No job {jobId}"), 404
+        return jsonify(job)
+
+    @app.get("/stats")
+    def getStats():
+        return jsonify(manager.stats())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Shared scrape and download job server")
+    parser.add_argument("--host", default = "127.0.0.1", help = "Use 0.0.0.0 to accept jobs from other machines")
+    parser.add_argument("--port", type = int, default = DEFAULT_PORT)
+    parser.add_argument("--jobs", type = int, default = MAX_CONCURRENT_JOBS, help = "Jobs that run at the same time")
+    args = parser.parse_args()
+
+    configure_logging(Path("LogFile_server.log"))
+    app = createApp(JobManager(args.jobs))
+    app.run(host = args.host, port = args.port, threaded = True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from pathlib import Path
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+
+#Ad click IDs and utm_ campaign parameters only track where a link was clicked and never change the page
+#or PDF returned.  Other parameters, even ones named like ref, may select the document, so they are kept
+TRACKING_PARAMETERS = {'gclid', 'dclid', 'fbclid', 'msclkid'}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+#The application folder: next to the executable when frozen, otherwise the folder main.py is in
+APPLICATION_FOLDER = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).resolve().parent.parent
+REDIRECT_CACHE_PATH = APPLICATION_FOLDER / "RedirectCache.sqlite"
+REDIRECT_CACHE_DAYS = 7
+MAX_REDIRECT_HOPS = 5
+
+
+_redirectCache = None
+_redirectCacheLock = threading.Lock()
+
+
+def canonicalURL(url):
+    """
+    Normalize a URL so the different ways the same page or PDF is written compare equal.
+
+    The scheme and host are lower cased, default ports, fragments and tracking parameters are removed and
+    the remaining query parameters are sorted.  The scheme itself is kept, as some hosts only answer on
+    one of http and https (use resourceKey to compare URLs regardless of scheme).  Values that are not
+    absolute http(s) URLs are returned stripped but otherwise unchanged.
+
+    The result is only a key for deduplicating and caching.  Requests are made to, and sheets store, the
+    URL as it was written, since some servers treat "?id" and "?id=" or a re-encoded value differently.
+
+    Parameters:
+    - url (str): The URL as found in an input sheet or an openWindow(...) call.
+
+    Returns:
+    - str: The canonical URL.
+    """
+    if not isinstance(url, str):
+        return url
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username or parts.password:
+        host = f"{parts.netloc.rsplit('@', 1)[0]}@{host}"
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values = True)
+                   if key.lower() not in TRACKING_PARAMETERS and not key.lower().startswith(TRACKING_PREFIXES))
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def resourceKey(url):
+    """
+    Return the key two URLs of the same resource share, i.e. the canonical URL without its scheme.
+    Used to fetch each page or PDF once when it is listed under both http and https.
+    """
+    canonical = canonicalURL(url)
+    if not isinstance(canonical, str):
+        return canonical
+    return canonical.split("://", 1)[-1]
+
+
+class RedirectCache:
+    """
+    Persistent record of where redirecting URLs end up, so later fetches go straight to the target.
+
+    Redirects are kept for REDIRECT_CACHE_DAYS days in a SQLite file shared by every run on the machine.
+    They are looked up by canonical URL, and the target is kept exactly as the server redirected to it.
+
+    Parameters:
+    - cachePath (Path, optional): The SQLite file. Defaults to REDIRECT_CACHE_PATH.
+    - maxAgeDays (int, optional): How long a recorded redirect is trusted.
+    """
+
+    def __init__(self, cachePath = REDIRECT_CACHE_PATH, maxAgeDays = REDIRECT_CACHE_DAYS):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(cachePath), check_same_thread = False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS redirects (url TEXT PRIMARY KEY, target TEXT NOT NULL, resolved REAL NOT NULL)")
+            self.conn.execute("DELETE FROM redirects WHERE resolved < ?", (time.time() - maxAgeDays * 24 * 60 * 60,))
+        self.targets = dict(self.conn.execute("SELECT url, target FROM redirects"))
+
+    def close(self):
+        self.conn.close()
+
+    def resolve(self, url):
+        """
+        Return the URL to request: where it redirected to last time if known, otherwise the URL itself.
+        """
+        target = url.strip() if isinstance(url, str) else url
+        with self.lock:
+            for _ in range(MAX_REDIRECT_HOPS):
+                key = canonicalURL(target)
+                if key not in self.targets:
+                    break
+                target = self.targets[key]
+        return target
+
+    def record(self, url, finalURL):
+        source = canonicalURL(url)
+        if source == canonicalURL(finalURL):
+            return
+        with self.lock:
+            if self.targets.get(source) == finalURL:
+                return
+            self.targets[source] = finalURL
+            try:
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO redirects (url, target, resolved) VALUES (?, ?, ?)", (source, finalURL, time.time()))
+            except sqlite3.Error as e:
+                #Still used for the rest of this run, it just is not remembered for the next one
+                logging.warning(f"Could not save the redirect of {url}: {e}")
+        logging.debug(f"Recorded redirect {source} -> {finalURL}")
+
+    def recordResponse(self, url, response):
+        """
+        Record the redirect a response followed, if any.
+        """
+        if response.history:
+            self.record(url, response.url)
+
+    def retryTarget(self, url, fetchURL):
+        """
+        Return the URL to request again after fetchURL answered with an HTTP error.
+
+        If fetchURL was a recorded redirect target, the redirect may have gone stale, so it is forgotten
+        and the original URL is followed again.
+        """
+        if fetchURL != url:
+            self.invalidate(url)
+        return url
+
+    def invalidate(self, url):
+        source = canonicalURL(url)
+        with self.lock:
+            if self.targets.pop(source, None) is not None:
+                try:
+                    with self.conn:
+                        self.conn.execute("DELETE FROM redirects WHERE url = ?", (source,))
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not remove the redirect of {url}: {e}")
+
+
+def getRedirectCache():
+    """
+    Return the redirect cache shared by every fetch in this process, opening it on first use.
+
+    If the application folder is not writable the redirects are only kept in memory for this run.
+    """
+    global _redirectCache
+    with _redirectCacheLock:
+        if _redirectCache is None:
+            try:
+                _redirectCache = RedirectCache()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not open {REDIRECT_CACHE_PATH}: {e}. Redirects will not be remembered after this run")
+                _redirectCache = RedirectCache(":memory:")
+        return _redirectCache
@@ -0,0 +1,92 @@
+import hashlib
+import io
+import logging
+import re
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+MAX_DOWNLOAD_ATTEMPTS = 3
+#The PDF spec lets the header and the end of file marker sit slightly away from the file edges
+HEADER_WINDOW = 1024
+TRAILER_WINDOW = 1024
+
+PAGE_TREE_COUNT_REGEX = rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b'
+PAGE_OBJECT_REGEX = rb'/Type\s*/Page(?![s\w])'
+
+
+def countPages(data):
+    """
+    Return the number of pages in a PDF, read with pypdf when it is installed.
+
+    PDF 1.5 and later files often keep the page tree in compressed object streams, which only a PDF parser
+    can read.  Without pypdf, or when it cannot parse the file, the page count is estimated with
+    countPagesFallback.
+    """
+    if PdfReader is not None:
+        try:
+            return len(PdfReader(io.BytesIO(data)).pages) or None
+        except Exception as e:
+            logging.warning(f"pypdf could not count the pages: {e}")
+    return countPagesFallback(data)
+
+
+def countPagesFallback(data):
+    """
+    Estimate the number of pages in a PDF without a PDF library.
+
+    The /Count of the largest page tree node is the page count of the document.  When the page tree sits
+    in a compressed object stream it cannot be read this way, and the uncompressed /Type /Page objects are
+    counted instead.  Returns None when neither is found.
+    """
+    counts = [int(first or second) for first, second in re.findall(PAGE_TREE_COUNT_REGEX, data)]
+    if counts:
+        return max(counts)
+    pages = len(re.findall(PAGE_OBJECT_REGEX, data))
+    return pages or None
+
+
+def validatePDF(filePath, expectedSize = None):
+    """
+    Check that a downloaded file is a complete PDF and compute its hash and page count.
+
+    Runs in a worker process, so it only takes and returns plain picklable values.
+
+    Parameters:
+    - filePath (str): Path of the downloaded file.
+    - expectedSize (int, optional): The Content-Length reported by the server, if known.
+
+    Returns:
+    - dict: 'valid' (bool), 'reason' (str, empty when valid), 'sha256' (str), 'pages' (int or None) and 'size' (int).
+    """
+    result = {'valid': False, 'reason': "", 'sha256': None, 'pages': None, 'size': None}
+    try:
+        with open(filePath, 'rb') as pdfFile:
+            data = pdfFile.read()
+    except OSError as e:
+        result['reason'] = f"Could not read file: {e}"
+        return result
+
+    result['size'] = len(data)
+    result['sha256'] = hashlib.sha256(data).hexdigest()
+
+    if b'%PDF-' not in data[:HEADER_WINDOW]:
+        result['reason'] = "Not a PDF (missing %PDF header)"
+    elif b'%%EOF' not in data[-TRAILER_WINDOW:]:
+        result['reason'] = "Truncated PDF (missing %%EOF trailer)"
+    elif expectedSize and expectedSize == expectedSize and len(data) != int(expectedSize):
+        result['reason'] = f"Size {len(data)} does not match Content-Length {int(expectedSize)}"
+    else:
+        result['valid'] = True
+        result['pages'] = countPages(data)
+    return result
+
+
+def validationColumns(result):
+    """
+    Return the values written to the Valid, SHA256 and Pages columns of the PDFs sheet for a validation result.
+    """
+    return ("True" if result['valid'] else result['reason'], result['sha256'], result['pages'])
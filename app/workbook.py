@@ -0,0 +1,166 @@
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+import pandas as pd
+import logging
+import re
+
+
+COMPANY_ID_COLUMN = 'Company ID'
+#Written for PDFs whose company is not in the Companies sheet, so the lookup always shows "null"
+MISSING_COMPANY_ID = -1
+LEGACY_COMPANY_FORMULA_REGEX = r'^=IFERROR\(VLOOKUP\("(.*)",Companies!A:A, 1, FALSE\), "null"\)$'
+FILE_LINK_REGEX = r'^=HYPERLINK\("(.*)", "CLICK FOR FILE"\)$'
+COMPANY_FORMULA_REGEX = r'^=IF\(IFERROR\(LOOKUP\((-?\d+),Companies!.*\),0\)=\1,"(.*)","null"\)$'
+
+
+def companyLookupFormula(companyName):
+    """
+    Return the formula placed in the PDFs sheet Company column of workbooks without a Company ID column.
+    It shows "null" once the company's row is deleted from the Companies sheet, which is how analysts
+    exclude a company from the download.
+    """
+    return f"=IFERROR(VLOOKUP(\"{companyName}\",Companies!A:A, 1, FALSE), \"null\")"
+
+
+def companyLookupFormulas(companyNames, companyIds, dfCompany):
+    """
+    Build the PDFs sheet Company formulas for a whole column at once.
+
+    Each formula looks its Company ID up in the Companies sheet's Company ID column, which is numbered in
+    ascending row order, so LOOKUP can binary search a range bounded to the company rows.  This replaces a
+    full-column VLOOKUP per PDF row, which made recalculating large workbooks quadratic.  The formula shows
+    the company name while the company's row exists and "null" once it is deleted.
+
+    Parameters:
+    - companyNames (Series): The company name of each PDF row.
+    - companyIds (Series): The Company ID of each PDF row, or MISSING_COMPANY_ID.
+    - dfCompany (DataFrame): The Companies sheet the formulas will refer to.
+
+    Returns:
+    - Series: The formulas.
+    """
+    idColumn = get_column_letter(dfCompany.columns.get_loc(COMPANY_ID_COLUMN) + 1)
+    idRange = f"Companies!${idColumn}$2:${idColumn}${max(len(dfCompany), 1) + 1}"
+    ids = pd.to_numeric(pd.Series(list(companyIds), index = companyNames.index, dtype = object)).fillna(MISSING_COMPANY_ID).astype(int).astype(str)
+    names = companyNames.fillna("null").astype(str).str.replace('"', '""', regex = False)
+    return "=IF(IFERROR(LOOKUP(" + ids + "," + idRange + "),0)=" + ids + ",\"" + names + "\",\"null\")"
+
+
+def companyNameFromCell(value):
+    """
+    Recover the company name from a PDFs sheet Company cell, whether it holds a lookup formula or a plain name.
+    """
+    if not isinstance(value, str):
+        return None
+    match = re.match(COMPANY_FORMULA_REGEX, value)
+    if match:
+        name = match.group(2).replace('""', '"')
+        return None if name == "null" else name
+    match = re.match(LEGACY_COMPANY_FORMULA_REGEX, value)
+    if match:
+        return match.group(1)
+    return None if value == "null" else value
+
+
+def readSheetFormulas(path, sheetName):
+    """
+    Read a sheet into a DataFrame keeping formulas as their text (e.g. "=HYPERLINK(...)") instead of their cached values.
+
+    pandas.read_excel only sees the cached results, which are empty until Excel has recalculated the file,
+    so it cannot be used to carry formulas over into a rewritten workbook.
+
+    Parameters:
+    - path (Path): Path to the Excel file.
+    - sheetName (str): Name of the sheet to read.
+
+    Returns:
+    - DataFrame or None: The sheet with its header row as columns, or None if the sheet does not exist.
+    """
+    workbook = load_workbook(path, read_only = True, data_only = False)
+    try:
+        if sheetName not in workbook.sheetnames:
+            return None
+        rows = list(workbook[sheetName].iter_rows(values_only = True))
+    finally:
+        workbook.close()
+    if not rows:
+        return pd.DataFrame()
+    columns = [column for column in rows[0] if column is not None]
+    return pd.DataFrame([row[:len(columns)] for row in rows[1:]], columns = columns)
+
+
+def originalCompanyNames(path, dfPDF):
+    """
+    Return the company name each PDFs sheet row was scraped for, read from its Company formula.
+
+    After a refresh the Company values of companies deleted from the Companies sheet read "null", so the
+    formulas have to be rebuilt from these names.  Otherwise the next incremental scrape no longer knows the
+    company was deleted and adds it back.
+
+    Parameters:
+    - path (Path): Path to the Excel file containing the PDFs sheet.
+    - dfPDF (DataFrame): The PDFs sheet as read with its refreshed values.
+
+    Returns:
+    - Series: The company names, aligned with dfPDF.  Missing where a row never had a company.
+    """
+    dfFormulas = readSheetFormulas(path, 'PDFs')
+    if dfFormulas is None or 'Company' not in dfFormulas.columns or len(dfFormulas) != len(dfPDF):
+        logging.warning(f"Could not read the Company formulas of {path}. Using the refreshed values")
+        return dfPDF['Company'].map(companyNameFromCell)
+    return pd.Series(dfFormulas['Company'].map(companyNameFromCell).tolist(), index = dfPDF.index, dtype = object)
+
+
+def sortCompaniesById(path):
+    """
+    Make sure the Companies sheet's Company ID column is increasing before Excel recalculates the workbook.
+
+    The PDFs sheet Company formulas binary search that column with LOOKUP, which silently returns wrong
+    companies once an analyst sorts the sheet by another column (e.g. Assets).  The rows are put back in
+    Company ID order, keeping their values and formulas.  Rows whose Company was cleared instead of deleted
+    are left out of the check and dropped when the sheet is re-sorted.
+
+    Parameters:
+    - path (Path): Path to the Excel file.
+
+    Returns:
+    - bool: True if the sheet had to be re-sorted.
+
+    Raises:
+    - ValueError: If a company has no Company ID or two companies share one, so no order would work.
+    """
+    dfCompany = readSheetFormulas(path, 'Companies')
+    if dfCompany is None or COMPANY_ID_COLUMN not in dfCompany.columns or 'Company' not in dfCompany.columns:
+        return False
+    dfCompany = dfCompany[dfCompany['Company'].notna() & (dfCompany['Company'].astype(str).str.strip() != "")]
+    companyIds = pd.to_numeric(dfCompany[COMPANY_ID_COLUMN], errors = 'coerce')
+    if companyIds.isna().any() or companyIds.duplicated().any():
+        raise ValueError(f"Every company in the Companies sheet of {path.name} needs its own {COMPANY_ID_COLUMN}. "
+                         f"Fill in the missing or repeated IDs, or run the scrape again")
+    if companyIds.is_monotonic_increasing:
+        return False
+
+    logging.warning(f"The Companies sheet of {path} is not in {COMPANY_ID_COLUMN} order. Sorting it back")
+    dfCompany = dfCompany.iloc[companyIds.argsort(kind = "stable")]
+    with pd.ExcelWriter(path, engine = 'openpyxl', mode = 'a', if_sheet_exists = 'replace') as writer:
+        dfCompany.to_excel(writer, sheet_name = 'Companies', index = False)
+    return True
+
+
+def savedFilePaths(path, dfPDF):
+    """
+    Return the local file each PDFs sheet row was saved to, read from its Local FilePath hyperlink.
+
+    Parameters:
+    - path (Path): Path to the Excel file containing the PDFs sheet.
+    - dfPDF (DataFrame): The PDFs sheet as read with its refreshed values.
+
+    Returns:
+    - Series: The file paths, aligned with dfPDF.  Missing where a row has no saved file.
+    """
+    dfFormulas = readSheetFormulas(path, 'PDFs')
+    if dfFormulas is None or 'Local FilePath' not in dfFormulas.columns or len(dfFormulas) != len(dfPDF):
+        return pd.Series(None, index = dfPDF.index, dtype = object)
+    matches = [re.match(FILE_LINK_REGEX, link) if isinstance(link, str) else None for link in dfFormulas['Local FilePath']]
+    return pd.Series([match.group(1) if match and match.group(1) != "null" else None for match in matches],
+                     index = dfPDF.index, dtype = object)
@@ -0,0 +1,293 @@
+from abc import ABC, abstractmethod
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+
+DEFAULT_LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkItem:
+
+    def __init__(self, itemId, kind, payload, attempts = 0, workerId = None, result = None, status = PENDING, runId = None):
+        self.itemId = itemId
+        self.runId = runId
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.workerId = workerId
+        self.result = result
+        self.status = status
+
+    def __str__(self):
+        return f"{self.kind} {self.itemId} ({self.status}): {self.payload}"
+
+
+class WorkQueue(ABC):
+    """
+    Shared queue of leased work items used by the coordinator and the workers.
+
+    A worker leases an item for a fixed number of seconds.  If the worker does not complete or renew
+    the lease before it expires, the item becomes available to any other worker again.  Subclasses
+    implement the storage; LocalWorkQueue keeps everything in memory and SQLiteWorkQueue keeps it in
+    a database file that can live on a shared volume.
+
+    Each coordinator tags the items it puts with its own run ID and only counts, merges and clears the
+    items of that run, so a scrape and a download run can share one queue.
+    """
+
+    @abstractmethod
+    def put(self, kind, payloads, runId = None):
+        pass
+
+    @abstractmethod
+    def lease(self, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        pass
+
+    @abstractmethod
+    def renew(self, itemId, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        pass
+
+    @abstractmethod
+    def complete(self, itemId, workerId, result):
+        pass
+
+    @abstractmethod
+    def release(self, itemId, workerId):
+        """
+        Put a leased item back in the queue so it is tried again, counting the attempt.
+        """
+
+    @abstractmethod
+    def counts(self, runId = None):
+        pass
+
+    @abstractmethod
+    def finished(self, kind = None, runId = None):
+        pass
+
+    @abstractmethod
+    def clear(self, runId = None):
+        pass
+
+    def isDrained(self):
+        """
+        Return True once every item in the queue is either done or has failed too many times.
+        """
+        counts = self.counts()
+        return counts.get(PENDING, 0) == 0 and counts.get(LEASED, 0) == 0
+
+
+class LocalWorkQueue(WorkQueue):
+    """
+    In-memory queue for running the coordinator and workers in a single process.
+    """
+
+    def __init__(self, maxAttempts = MAX_ATTEMPTS):
+        self.maxAttempts = maxAttempts
+        self.items = {}
+        self.leaseExpiry = {}
+        self.lock = threading.Lock()
+
+    def put(self, kind, payloads, runId = None):
+        with self.lock:
+            for payload in payloads:
+                itemId = uuid.uuid4().hex
+                self.items[itemId] = WorkItem(itemId, kind, payload, runId = runId)
+
+    def lease(self, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        with self.lock:
+            for item in self.items.values():
+                expired = item.status == LEASED and self.leaseExpiry[item.itemId] < now
+                if item.status != PENDING and not expired:
+                    continue
+                if expired:
+                    logging.warning(f"Lease on {item.itemId} held by {item.workerId} expired. Re-leasing")
+                if item.attempts >= self.maxAttempts:
+                    item.status = FAILED
+                    item.result = {'error': f"Gave up after {item.attempts} attempts"}
+                    continue
+                item.status = LEASED
+                item.workerId = workerId
+                item.attempts += 1
+                self.leaseExpiry[item.itemId] = now + leaseSeconds
+                return WorkItem(item.itemId, item.kind, item.payload, item.attempts, workerId, status = LEASED, runId = item.runId)
+        return None
+
+    def renew(self, itemId, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        with self.lock:
+            item = self.items.get(itemId)
+            if item is None or item.status != LEASED or item.workerId != workerId:
+                return False
+            self.leaseExpiry[itemId] = time.time() + leaseSeconds
+            return True
+
+    def complete(self, itemId, workerId, result):
+        with self.lock:
+            item = self.items.get(itemId)
+            if item is None or item.status != LEASED or item.workerId != workerId:
+                logging.warning(f"{workerId} completed {itemId} after losing its lease. Result dropped")
+                return False
+            item.status = DONE
+            item.result = result
+            return True
+
+    def release(self, itemId, workerId):
+        with self.lock:
+            item = self.items.get(itemId)
+            if item is None or item.status != LEASED or item.workerId != workerId:
+                return False
+            item.status = PENDING
+            return True
+
+    def counts(self, runId = None):
+        with self.lock:
+            counts = {}
+            for item in self.items.values():
+                if runId is None or item.runId == runId:
+                    counts[item.status] = counts.get(item.status, 0) + 1
+            return counts
+
+    def finished(self, kind = None, runId = None):
+        with self.lock:
+            return [item for item in self.items.values()
+                    if item.status in (DONE, FAILED) and (kind is None or item.kind == kind) and (runId is None or item.runId == runId)]
+
+    def clear(self, runId = None):
+        with self.lock:
+            for itemId in [itemId for itemId, item in self.items.items() if runId is None or item.runId == runId]:
+                del self.items[itemId]
+                self.leaseExpiry.pop(itemId, None)
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Queue stored in a SQLite database so workers on several machines can share it over a network volume.
+
+    Every lease runs inside a BEGIN IMMEDIATE transaction, so two workers can never claim the same item.
+    """
+
+    def __init__(self, dbPath, maxAttempts = MAX_ATTEMPTS, busyTimeout = 60):
+        self.dbPath = str(dbPath)
+        self.maxAttempts = maxAttempts
+        self.busyTimeout = busyTimeout
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id TEXT PRIMARY KEY,
+                    run_id TEXT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    result TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, lease_expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS work_items_run ON work_items (run_id, status)")
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.dbPath, timeout = self.busyTimeout, isolation_level = None)
+            self.local.conn = conn
+        return conn
+
+    def put(self, kind, payloads, runId = None):
+        rows = [(uuid.uuid4().hex, runId, kind, json.dumps(payload), PENDING) for payload in payloads]
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO work_items (id, run_id, kind, payload, status) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def lease(self, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            #Items whose worker stopped renewing and used up their attempts are marked failed
+            conn.execute(
+                "UPDATE work_items SET status = ?, result = ? "
+                "WHERE attempts >= ? AND (status = ? OR (status = ? AND lease_expires < ?))",
+                (FAILED, json.dumps({'error': f"Gave up after {self.maxAttempts} attempts"}),
+                 self.maxAttempts, PENDING, LEASED, now))
+            row = conn.execute(
+                "SELECT id, run_id, kind, payload, attempts, worker, status FROM work_items "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) LIMIT 1",
+                (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            itemId, runId, kind, payload, attempts, previousWorker, status = row
+            if status == LEASED:
+                logging.warning(f"Lease on {itemId} held by {previousWorker} expired. Re-leasing")
+            conn.execute(
+                "UPDATE work_items SET status = ?, worker = ?, attempts = ?, lease_expires = ? WHERE id = ?",
+                (LEASED, workerId, attempts + 1, now + leaseSeconds, itemId))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return WorkItem(itemId, kind, json.loads(payload), attempts + 1, workerId, status = LEASED, runId = runId)
+
+    def renew(self, itemId, workerId, leaseSeconds = DEFAULT_LEASE_SECONDS):
+        cursor = self.connect().execute(
+            "UPDATE work_items SET lease_expires = ? WHERE id = ? AND status = ? AND worker = ?",
+            (time.time() + leaseSeconds, itemId, LEASED, workerId))
+        return cursor.rowcount == 1
+
+    def complete(self, itemId, workerId, result):
+        cursor = self.connect().execute(
+            "UPDATE work_items SET status = ?, result = ? WHERE id = ? AND status = ? AND worker = ?",
+            (DONE, json.dumps(result), itemId, LEASED, workerId))
+        if cursor.rowcount != 1:
+            logging.warning(f"{workerId} completed {itemId} after losing its lease. Result dropped")
+            return False
+        return True
+
+    def release(self, itemId, workerId):
+        cursor = self.connect().execute(
+            "UPDATE work_items SET status = ?, lease_expires = NULL WHERE id = ? AND status = ? AND worker = ?",
+            (PENDING, itemId, LEASED, workerId))
+        return cursor.rowcount == 1
+
+    def counts(self, runId = None):
+        if runId is None:
+            rows = self.connect().execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall()
+        else:
+            rows = self.connect().execute("SELECT status, COUNT(*) FROM work_items WHERE run_id = ? GROUP BY status", (runId,)).fetchall()
+        return dict(rows)
+
+    def finished(self, kind = None, runId = None):
+        query = "SELECT id, run_id, kind, payload, attempts, worker, result, status FROM work_items WHERE status IN (?, ?)"
+        params = [DONE, FAILED]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        if runId is not None:
+            query += " AND run_id = ?"
+            params.append(runId)
+        return [WorkItem(itemId, itemKind, json.loads(payload), attempts, worker, json.loads(result) if result else None, status, itemRunId)
+                for itemId, itemRunId, itemKind, payload, attempts, worker, result, status in self.connect().execute(query, params)]
+
+    def clear(self, runId = None):
+        if runId is None:
+            self.connect().execute("DELETE FROM work_items")
+        else:
+            self.connect().execute("DELETE FROM work_items WHERE run_id = ?", (runId,))
@@ -4,6 +4,7 @@ import logging
 from pathlib import Path
 import tkinter
 import threading
+import multiprocessing
 
 
 def main():
@@ -21,4 +22,6 @@ def main():
 
 
 if __name__ == "__main__":
+    #Needed for the PDF validation process pool in the packaged executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
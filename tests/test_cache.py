@@ -0,0 +1,42 @@
+import threading
+import time
+import unittest
+from app.cache import SingleFlightCache
+
+class TestSingleFlightCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SingleFlightCache()
+
+    def test_concurrent_callers_compute_once(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return "page"
+        results = []
+        threads = [threading.Thread(target = lambda: results.append(self.cache.getOrCompute("url", compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["page"] * 5)
+
+    def test_uncacheable_results_are_recomputed(self):
+        calls = []
+        compute = lambda: calls.append(1) or None
+        self.cache.getOrCompute("url", compute, cacheable = lambda value: value is not None)
+        self.cache.getOrCompute("url", compute, cacheable = lambda value: value is not None)
+        self.assertEqual(len(calls), 2)
+
+    def test_expired_and_invalidated_values_are_recomputed(self):
+        cache = SingleFlightCache(ttl = 0.05)
+        cache.getOrCompute("url", lambda: 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.getOrCompute("url", lambda: 2), 2)
+        cache.invalidate("url")
+        self.assertEqual(cache.getOrCompute("url", lambda: 3), 3)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from app.htmlstream import readUntilElementClosed
+from app.scraper import readPageData, MAX_DRAIN_BYTES
+
+PAGE = ("<html><head><title>Fund and Fee Information</title></head><body><h2><b>Geico</b></h2>"
+        "<div id='planDocuments'><div><a href=\"javascript:openWindow('a.pdf')\"><li>Plan<br></a></div></div>"
+        "<table>fund tables</table><script>var x = 1;</script></body></html>")
+
+def chunked(text, size = 16):
+    data = text.encode("utf-8")
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+class TestReadUntilElementClosed(unittest.TestCase):
+    def test_stops_after_element_closed(self):
+        html, bytesRead, closed = readUntilElementClosed(chunked(PAGE), "planDocuments")
+        self.assertTrue(closed)
+        self.assertIn("a.pdf", html)
+        self.assertNotIn("<script>", html)
+        self.assertLess(bytesRead, len(PAGE))
+
+    def test_reads_everything_without_element(self):
+        page = PAGE.replace("planDocuments", "otherDocuments")
+        html, bytesRead, closed = readUntilElementClosed(chunked(page), "planDocuments")
+        self.assertFalse(closed)
+        self.assertEqual(html, page)
+        self.assertEqual(bytesRead, len(page))
+
+    def test_multibyte_characters_split_across_chunks(self):
+        page = PAGE.replace("Geico", "Café Société")
+        html, bytesRead, closed = readUntilElementClosed(chunked(page, size = 7), "planDocuments")
+        self.assertIn("Café Société", html)
+
+class FakeResponse:
+    url = "https://plans.example.com/plan"
+    encoding = "utf-8"
+
+    def __init__(self, page):
+        self.chunks = chunked(page)
+        self.consumed = 0
+        self.closed = False
+
+    def iter_content(self, size):
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+class TestReadPageData(unittest.TestCase):
+    def test_short_remainder_drained_so_connection_is_reused(self):
+        response = FakeResponse(PAGE)
+        html = readPageData(response, stream = True)
+        self.assertNotIn("<script>", html)
+        self.assertEqual(response.consumed, len(response.chunks))
+        self.assertTrue(response.closed)
+
+    def test_long_remainder_cut_off(self):
+        response = FakeResponse(PAGE + "<p>fund</p>" * (MAX_DRAIN_BYTES // 10))
+        readPageData(response, stream = True)
+        self.assertLess(response.consumed, len(response.chunks))
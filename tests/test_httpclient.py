@@ -0,0 +1,22 @@
+import unittest
+from unittest import mock
+from app import httpclient
+
+class TestHttpClient(unittest.TestCase):
+    def test_session_settings(self):
+        session = httpclient.createSession()
+        adapter = session.get_adapter("https://www.ta-retirement.com")
+        self.assertEqual(session.headers['Accept-Encoding'], "gzip, deflate")
+        self.assertEqual(adapter.timeout, httpclient.TIMEOUT)
+        self.assertEqual(adapter.max_retries.connect, httpclient.CONNECT_RETRIES)
+
+    def test_shared_session(self):
+        self.assertIs(httpclient.getSession(), httpclient.getSession())
+
+    def test_dns_lookups_cached(self):
+        lookup = mock.Mock(return_value = [("addrinfo",)])
+        with mock.patch.object(httpclient, "_originalGetaddrinfo", lookup), mock.patch.dict(httpclient._dnsCache, clear = True):
+            httpclient.cachedGetaddrinfo("example.com", 443)
+            result = httpclient.cachedGetaddrinfo("example.com", 443)
+        self.assertEqual(result, [("addrinfo",)])
+        lookup.assert_called_once()
@@ -0,0 +1,126 @@
+import tempfile
+import unittest
+import pandas as pd
+from pathlib import Path
+from classes.Company import Company
+from app.incremental import diffCompanies, loadPreviousOutput
+from app.workbook import companyLookupFormula, companyLookupFormulas, companyNameFromCell, originalCompanyNames, sortCompaniesById, readSheetFormulas
+
+class TestDiffCompanies(unittest.TestCase):
+    def setUp(self):
+        self.dfCompanyOld = pd.DataFrame({'Company': ["Geico"], 'Assets': [45000000], 'Plan Participants': [150], 'Company ID': [1]})
+        self.dfPDFOld = pd.DataFrame({
+            'Company': companyLookupFormulas(pd.Series(["Geico", "Geico", "Cintas"]), [1, 1, 2], self.dfCompanyOld),
+            'PDF Title': ["Plan Summary", "Fee Disclosure", "Plan Summary"],
+            'PDF URL': ["geico1.pdf", "geico2.pdf", "cintas1.pdf"],
+            'Source': "TransAmerica"})
+        geico = Company("Geico")
+        geico.add_pdf("geico1.pdf", "Plan Summary")
+        geico.add_pdf("geico3.pdf", "Amendment")
+        cintas = Company("Cintas")
+        cintas.add_pdf("cintas1.pdf", "Plan Summary")
+        cintas.add_pdf("cintas2.pdf", "Amendment")
+        self.dfCompany, self.dfPDF, self.dfChanges = diffCompanies([geico, cintas, Company("Acme")], self.dfCompanyOld, self.dfPDFOld)
+
+    def test_company_name_from_formula(self):
+        self.assertEqual(companyNameFromCell(self.dfPDFOld['Company'][2]), "Cintas")
+        self.assertEqual(companyNameFromCell(companyLookupFormula("Geico")), "Geico")
+        self.assertIsNone(companyNameFromCell("null"))
+
+    def test_company_ids_renumbered_and_formulas_rebuilt(self):
+        self.assertEqual(self.dfCompany['Company ID'].tolist(), [1, 2])
+        self.assertTrue(pd.isna(self.dfPDF['Company ID'][1]))
+        self.assertEqual(self.dfPDF['Company'][0], '=IF(IFERROR(LOOKUP(1,Companies!$D$2:$D$3),0)=1,"Geico","null")')
+        self.assertEqual(companyNameFromCell(self.dfPDF['Company'][1]), "Cintas")
+
+    def test_hand_edited_values_kept(self):
+        geico = self.dfCompany[self.dfCompany['Company'] == "Geico"].iloc[0]
+        self.assertEqual(geico['Assets'], 45000000)
+        self.assertEqual(geico['Plan Participants'], 150)
+
+    def test_deleted_company_not_added_back(self):
+        self.assertEqual(self.dfCompany['Company'].tolist(), ["Geico", "Acme"])
+
+    def test_only_changes_applied(self):
+        self.assertEqual(self.dfPDF['PDF URL'].tolist(), ["geico1.pdf", "cintas1.pdf", "geico3.pdf", "cintas2.pdf"])
+
+    def test_change_report(self):
+        changes = set(zip(self.dfChanges['Change'], self.dfChanges['PDF URL']))
+        self.assertEqual(changes, {("Added", "geico3.pdf"), ("Added", "cintas2.pdf"), ("Removed", "geico2.pdf")})
+
+
+class TestDeletedCompanyAcrossDownload(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.outputPath = Path(self.directory.name, "TA_ScrapedPDFs.xlsx")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scrapedCompanies(self):
+        geico = Company("Geico")
+        geico.add_pdf("geico1.pdf", "Plan Summary")
+        cintas = Company("Cintas")
+        cintas.add_pdf("cintas1.pdf", "Plan Summary")
+        return [geico, cintas]
+
+    def test_scrape_delete_download_incremental(self):
+        #Scrape
+        dfCompany, dfPDF, _ = diffCompanies(self.scrapedCompanies(), pd.DataFrame({'Company': []}),
+                                            pd.DataFrame({'Company': [], 'PDF Title': [], 'PDF URL': []}))
+        with pd.ExcelWriter(self.outputPath, engine='openpyxl') as writer:
+            dfCompany.to_excel(writer, sheet_name='Companies', index = False)
+            dfPDF.to_excel(writer, sheet_name='PDFs', index = False)
+
+        #The analyst deletes Cintas, and the refreshed PDFs sheet shows "null" for its PDF
+        dfCompany = dfCompany[dfCompany['Company'] != "Cintas"]
+        dfRefreshed = dfPDF.assign(Company = ["Geico", "null"])
+        with pd.ExcelWriter(self.outputPath, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+            dfCompany.to_excel(writer, sheet_name='Companies', index = False)
+
+        #Download rewrites the PDFs sheet the way savePDFLinks does
+        companyNames = originalCompanyNames(self.outputPath, dfRefreshed)
+        self.assertEqual(companyNames.tolist(), ["Geico", "Cintas"])
+        dfRefreshed['Company'] = companyLookupFormulas(companyNames, dfRefreshed['Company ID'], dfCompany)
+        with pd.ExcelWriter(self.outputPath, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+            dfRefreshed.to_excel(writer, sheet_name='PDFs', index = False)
+
+        #Incremental scrape
+        dfCompany, dfPDF, dfChanges = diffCompanies(self.scrapedCompanies(), *loadPreviousOutput(self.outputPath))
+        self.assertEqual(dfCompany['Company'].tolist(), ["Geico"])
+        self.assertEqual(dfPDF['PDF URL'].tolist(), ["geico1.pdf", "cintas1.pdf"])
+        self.assertTrue(dfChanges.empty)
+
+
+class TestSortCompaniesById(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name, "TA_ScrapedPDFs.xlsx")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writeCompanies(self, dfCompany):
+        with pd.ExcelWriter(self.path, engine='openpyxl') as writer:
+            dfCompany.to_excel(writer, sheet_name='Companies', index = False)
+
+    def test_sorted_by_assets_is_put_back_in_id_order(self):
+        self.writeCompanies(pd.DataFrame({'Company': ["Cintas", "Geico"], 'Assets': [900, 100], 'Company ID': [2, 1],
+                                          'Hotlink': ['=HYPERLINK("C:\\Cintas", "CLICK FOR FOLDER")', '=HYPERLINK("C:\\Geico", "CLICK FOR FOLDER")']}))
+        self.assertTrue(sortCompaniesById(self.path))
+        dfCompany = readSheetFormulas(self.path, 'Companies')
+        self.assertEqual(dfCompany['Company'].tolist(), ["Geico", "Cintas"])
+        self.assertEqual(dfCompany['Assets'].tolist(), [100, 900])
+        self.assertTrue(dfCompany['Hotlink'][0].startswith("=HYPERLINK"))
+        self.assertFalse(sortCompaniesById(self.path))
+
+    def test_cleared_rows_are_skipped(self):
+        self.writeCompanies(pd.DataFrame({'Company': ["Cintas", None, "Geico"], 'Company ID': [3, None, 1]}))
+        self.assertTrue(sortCompaniesById(self.path))
+        dfCompany = readSheetFormulas(self.path, 'Companies')
+        self.assertEqual(dfCompany['Company'].tolist(), ["Geico", "Cintas"])
+
+    def test_repeated_id_stops_the_download(self):
+        self.writeCompanies(pd.DataFrame({'Company': ["Cintas", "Geico"], 'Company ID': [1, 1]}))
+        with self.assertRaises(ValueError):
+            sortCompaniesById(self.path)
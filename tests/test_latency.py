@@ -0,0 +1,79 @@
+import csv
+import os
+import tempfile
+import threading
+import time
+import unittest
+import requests
+from app import profiling
+from app.httpclient import TIMEOUT
+from app.latency import LatencyTracker, MIN_TIMEOUT, hedgedCall, latencyTracker
+from app.scraper import fetchPage
+
+class TestLatencyTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = LatencyTracker(minSamples = 10, hedgeBudget = 0)
+
+    def test_default_timeout_until_enough_samples(self):
+        self.tracker.record("https://slow.example.com/a", 0.2)
+        self.assertEqual(self.tracker.timeoutFor("https://slow.example.com/b"), TIMEOUT)
+
+    def test_timeout_follows_host_percentiles(self):
+        for seconds in [0.5] * 9 + [2.0]:
+            self.tracker.record("https://plans.example.com/a", seconds)
+        self.assertEqual(self.tracker.percentile("https://plans.example.com/b", 95), 2.0)
+        self.assertEqual(self.tracker.timeoutFor("https://plans.example.com/b"), (min(8.0, TIMEOUT[0]), min(8.0, TIMEOUT[1])))
+        for seconds in [0.01] * 10:
+            self.tracker.record("https://fast.example.com/a", seconds)
+        self.assertEqual(self.tracker.timeoutFor("https://fast.example.com/a"), MIN_TIMEOUT)
+
+    def test_hedged_copy_wins_when_first_stalls(self):
+        for _ in range(10):
+            self.tracker.record("https://plans.example.com/a", 0.05)
+        calls = []
+        lock = threading.Lock()
+        def fetch():
+            with lock:
+                calls.append(1)
+                first = len(calls) == 1
+            time.sleep(2 if first else 0.01)
+            return "slow" if first else "hedged"
+        started = time.perf_counter()
+        self.assertEqual(hedgedCall(fetch, "https://plans.example.com/a", self.tracker), "hedged")
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(self.tracker.stats()['hedges'], 1)
+
+    def test_budget_limits_hedges(self):
+        for _ in range(10):
+            self.tracker.record("https://plans.example.com/a", 0.01)
+        for _ in range(5):
+            hedgedCall(lambda: time.sleep(0.05) or "done", "https://plans.example.com/a", self.tracker)
+        self.assertLessEqual(self.tracker.stats()['hedges'], 2)
+
+    def test_hedged_calls_are_profiled(self):
+        for _ in range(10):
+            self.tracker.record("https://plans.example.com/a", 0.01)
+        with tempfile.TemporaryDirectory() as directory:
+            with profiling.profiledRun(directory, True):
+                with profiling.stage("scraping"):
+                    hedgedCall(lambda: "done", "https://plans.example.com/a", self.tracker)
+            with open(os.path.join(directory, "threads.csv")) as csvFile:
+                threadNames = [row['Thread'] for row in csv.DictReader(csvFile)]
+        self.assertTrue(any(name.startswith("hedge") for name in threadNames))
+
+class TestFetchPageTimeouts(unittest.TestCase):
+    def test_timed_out_request_recorded_as_a_sample(self):
+        class TimingOutSession:
+            def get(self, url, timeout, stream):
+                self.timeout = timeout
+                time.sleep(0.05)
+                raise requests.exceptions.ReadTimeout("timed out")
+        session = TimingOutSession()
+        url = "https://timeout.example.com/plan"
+        with self.assertRaises(requests.exceptions.Timeout):
+            fetchPage(url, url, session, stream = False, timeout = TIMEOUT)
+        self.assertEqual(session.timeout, TIMEOUT)
+        self.assertGreaterEqual(latencyTracker.samples["timeout.example.com"][-1], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
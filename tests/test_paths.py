@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from pathlib import Path
+from classes.Company import Company
+from app.incremental import diffCompanies, loadPreviousOutput
+from app.paths import planTargetPaths, sanitizeNames
+from app.workbook import companyLookupFormulas, savedFilePaths
+
+class TestPlanTargetPaths(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dfPDF = pd.DataFrame({
+            'Company': ["Geico", "Geico", None, "Cintas/Uniforms"],
+            'PDF Title': ["Plan Summary", "plan summary", "Fee Disclosure", "Fee: Disclosure?\n"]})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sanitize_names(self):
+        names = pd.Series(["Tax/PDF", "CON", "...", None])
+        self.assertEqual(sanitizeNames(names).tolist()[:3], ["Tax-PDF", "_CON", "Untitled PDF"])
+        self.assertTrue(pd.isna(sanitizeNames(names)[3]))
+
+    def test_collisions_get_suffixes(self):
+        targetPaths = planTargetPaths(self.dfPDF, self.directory.name)
+        self.assertEqual(targetPaths[0], os.path.join(self.directory.name, "Geico", "Plan Summary.pdf"))
+        self.assertEqual(targetPaths[1], os.path.join(self.directory.name, "Geico", "plan summary (2).pdf"))
+
+    def test_suffix_skips_names_already_taken(self):
+        dfPDF = pd.DataFrame({'Company': ["Geico"] * 4, 'PDF Title': ["Plan (2)", "Plan", "Plan", "plan"]})
+        fileNames = [os.path.basename(path) for path in planTargetPaths(dfPDF, self.directory.name)]
+        self.assertEqual(fileNames, ["Plan (2).pdf", "Plan.pdf", "Plan (3).pdf", "plan (4).pdf"])
+
+    def test_changes_only_download_keeps_earlier_files(self):
+        #Scrape and download two PDFs with the same title
+        outputPath = Path(self.directory.name, "TA_ScrapedPDFs.xlsx")
+        dfPDF = pd.DataFrame({'Company': companyLookupFormulas(pd.Series(["Geico", "Geico"]), [1, 1], pd.DataFrame({'Company': ["Geico"], 'Company ID': [1]})),
+                              'Company ID': [1, 1], 'PDF Title': ["Plan", "Plan"], 'PDF URL': ["geico1.pdf", "geico2.pdf"]})
+        targetPaths = planTargetPaths(dfPDF.assign(Company = "Geico"), self.directory.name)
+        dfPDF['Local FilePath'] = [f'=HYPERLINK("{path}", "CLICK FOR FILE")' for path in targetPaths]
+        savedPaths = dict(zip(dfPDF['PDF URL'], targetPaths))
+        with pd.ExcelWriter(outputPath, engine='openpyxl') as writer:
+            pd.DataFrame({'Company': ["Geico"], 'Company ID': [1]}).to_excel(writer, sheet_name='Companies', index = False)
+            dfPDF.to_excel(writer, sheet_name='PDFs', index = False)
+
+        #The first PDF is removed from the page and a new one with the same title added
+        geico = Company("Geico")
+        geico.add_pdf("geico2.pdf", "Plan")
+        geico.add_pdf("geico3.pdf", "Plan")
+        _, dfPDF, dfChanges = diffCompanies([geico], *loadPreviousOutput(outputPath))
+        with pd.ExcelWriter(outputPath, engine='openpyxl') as writer:
+            dfPDF.to_excel(writer, sheet_name='PDFs', index = False)
+
+        #Changes-only download: only the added PDF gets a new file, and it does not take an earlier file's name
+        dfRefreshed = dfPDF.assign(Company = "Geico")
+        pending = dfRefreshed['PDF URL'].isin(dfChanges.loc[dfChanges['Change'] == "Added", 'PDF URL'])
+        targetPaths = planTargetPaths(dfRefreshed, self.directory.name, savedFilePaths(outputPath, dfRefreshed).where(~pending))
+        plannedPaths = dict(zip(dfRefreshed['PDF URL'], targetPaths))
+        self.assertEqual(os.path.basename(savedPaths["geico2.pdf"]), "Plan (2).pdf")
+        self.assertEqual(plannedPaths["geico2.pdf"], savedPaths["geico2.pdf"])
+        self.assertNotEqual(plannedPaths["geico3.pdf"], savedPaths["geico2.pdf"])
+
+    def test_removed_company_has_no_path(self):
+        targetPaths = planTargetPaths(self.dfPDF, self.directory.name)
+        self.assertTrue(pd.isna(targetPaths[2]))
+        self.assertEqual(targetPaths[3], os.path.join(self.directory.name, "Cintas-Uniforms", "Fee Disclosure.pdf"))
+
+    def test_company_folders_created(self):
+        planTargetPaths(self.dfPDF, self.directory.name)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["Cintas-Uniforms", "Geico"])
@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.preflight import preflightURLs, describeWorkload, isValidURL, BLANK_URL_ERROR, MALFORMED_URL_ERROR
+
+class TestPreflightURLs(unittest.TestCase):
+    def setUp(self):
+        self.sheets = {
+            'Plans A': pd.DataFrame({'URL': ["https://ta.example.com/plan?id=1", " ", np.nan, "not a url", "HTTPS://TA.example.com/plan?id=1"]}),
+            'Plans B': pd.DataFrame({'URL': ["http://ta.example.com/plan?id=1&utm_source=x", "https://ta.example.com/plan?id=2"],
+                                     'Active': ["True", "Max retries reached.  Failed to fetch data"]}),
+        }
+
+    def test_duplicates_grouped_across_sheets(self):
+        uniqueURLs, rowsOfURL, report = preflightURLs(self.sheets)
+        self.assertEqual(len(uniqueURLs), 2)
+        firstKey = next(iter(uniqueURLs))
+        self.assertEqual(uniqueURLs[firstKey], "https://ta.example.com/plan?id=1")
+        self.assertEqual(rowsOfURL[firstKey], {'Plans A': [0, 4], 'Plans B': [0]})
+        self.assertEqual((report['rows'], report['scheduled'], report['unique'], report['duplicates']), (7, 4, 2, 2))
+
+    def test_blank_and_malformed_get_immediate_status(self):
+        _, _, report = preflightURLs(self.sheets)
+        self.assertEqual(self.sheets['Plans A']['Active'].tolist()[1:4], [BLANK_URL_ERROR, BLANK_URL_ERROR, MALFORMED_URL_ERROR])
+        self.assertEqual((report['blank'], report['malformed']), (2, 1))
+        self.assertIn("2 unique URLs for 7 rows", describeWorkload(report))
+
+    def test_failures_only_skips_scraped_rows(self):
+        uniqueURLs, rowsOfURL, report = preflightURLs(self.sheets, failuresOnly = True)
+        self.assertEqual(sorted(uniqueURLs.values()), ["https://ta.example.com/plan?id=1", "https://ta.example.com/plan?id=2"])
+        self.assertEqual(report['skipped'], 1)
+
+    def test_is_valid_url(self):
+        self.assertTrue(isValidURL(" https://ta.example.com/x "))
+        self.assertFalse(isValidURL("ftp://ta.example.com/x"))
+        self.assertFalse(isValidURL("https://"))
+        self.assertFalse(isValidURL(42))
+
+if __name__ == '__main__':
+    unittest.main()
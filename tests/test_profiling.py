@@ -0,0 +1,36 @@
+import concurrent.futures
+import csv
+import os
+import tempfile
+import unittest
+from app import profiling
+
+@profiling.trackThread
+def busyWork(count):
+    return sum(number * number for number in range(count))
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(profiling.activeProfiler)
+        with profiling.stage("scraping"):
+            self.assertEqual(busyWork(10), 285)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_profiled_run_writes_stage_outputs(self):
+        with profiling.profiledRun(self.directory.name, True):
+            with profiling.stage("scraping"):
+                with concurrent.futures.ThreadPoolExecutor(max_workers = 2) as executor:
+                    list(executor.map(busyWork, [20000] * 4))
+        self.assertIsNone(profiling.activeProfiler)
+        files = set(os.listdir(self.directory.name))
+        for name in ["scraping.prof", "scraping.folded", "scraping_memory.snapshot", "scraping_memory.txt", "threads.csv"]:
+            self.assertIn(name, files)
+        with open(os.path.join(self.directory.name, "threads.csv")) as csvFile:
+            rows = list(csv.DictReader(csvFile))
+        self.assertEqual(sum(int(row['Calls']) for row in rows), 4)
@@ -0,0 +1,49 @@
+import time
+import unittest
+from types import SimpleNamespace
+from app.scheduler import DownloadScheduler, TokenBucket, savedContentLength
+
+class TestSavedContentLength(unittest.TestCase):
+    def test_compressed_length_is_not_the_file_size(self):
+        self.assertEqual(savedContentLength(SimpleNamespace(headers = {'Content-Length': "120"})), 120)
+        self.assertIsNone(savedContentLength(SimpleNamespace(headers = {'Content-Length': "120", 'Content-Encoding': "gzip"})))
+        self.assertIsNone(savedContentLength(SimpleNamespace(headers = {})))
+
+class TestDownloadScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = DownloadScheduler(maxConnectionsPerHost = 2)
+
+    def test_order_largest_first(self):
+        jobs = [("small", "A"), ("huge", "B"), ("medium", "C")]
+        sizes = {"small": 10, "huge": 5000, "medium": 300}
+        ordered = self.scheduler.order(jobs, sizes)
+        self.assertEqual([job[0] for job in ordered], ["huge", "medium", "small"])
+
+    def test_unknown_size_treated_as_median(self):
+        jobs = [("small", "A"), ("unknown", "B"), ("huge", "C"), ("medium", "D"), ("large", "E")]
+        sizes = {"small": 10, "unknown": None, "huge": 5000, "medium": 300, "large": 1000}
+        ordered = self.scheduler.order(jobs, sizes)
+        self.assertEqual([job[0] for job in ordered], ["huge", "large", "unknown", "medium", "small"])
+
+    def test_manifest_sizes_skip_head_requests(self):
+        sizes = self.scheduler.probeSizes(["http://a/1.pdf"], session = None, knownSizes = {"http://a/1.pdf": 42.0})
+        self.assertEqual(sizes, {"http://a/1.pdf": 42})
+
+    def test_manifest_present_skips_probing_new_urls(self):
+        knownSizes = {"http://a/1.pdf": 42.0, "http://a/2.pdf": float("nan")}
+        sizes = self.scheduler.probeSizes(["http://a/1.pdf", "http://a/2.pdf"], session = None, knownSizes = knownSizes)
+        self.assertEqual(sizes, {"http://a/1.pdf": 42})
+
+    def test_host_slot_shared_per_host(self):
+        first = self.scheduler.hostSlot("https://Plan.example.com/a.pdf")
+        second = self.scheduler.hostSlot("https://plan.example.com/b.pdf")
+        other = self.scheduler.hostSlot("https://other.example.com/a.pdf")
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate = 1000, burst = 100)
+        start = time.monotonic()
+        for count in range(3):
+            bucket.consume(100)
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
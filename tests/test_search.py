@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+import pandas as pd
+from app.search import SearchIndex, extractDocument, extractTextFallback, indexWorkbook
+
+def makePDF(text):
+    content = zlib.compress(f"BT /F1 12 Tf ({text}) Tj ET".encode("latin-1"))
+    return b"%PDF-1.4\n4 0 obj << /Filter /FlateDecode >>\nstream\n" + content + b"\nendstream\nendobj\n%%EOF\n"
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.directory.name, "index.sqlite"))
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_fallback_text_extraction(self):
+        data = b"stream\nBT (Plan \\(A\\)) Tj [(Fee) -250 (s)] TJ ET\nendstream"
+        self.assertEqual(extractTextFallback(data), "Plan (A) Fees")
+
+    def test_extract_document(self):
+        filePath = os.path.join(self.directory.name, "plan.pdf")
+        with open(filePath, 'wb') as pdfFile:
+            pdfFile.write(makePDF("Revenue sharing fee clause"))
+        path, sha256, text = extractDocument(filePath)
+        self.assertEqual(len(sha256), 64)
+        self.assertIn("fee clause", text)
+
+    def test_ranked_search(self):
+        self.index.add("a.pdf", "1", "Geico", "Plan Summary", "a-url", "participant fee clause and fees")
+        self.index.add("b.pdf", "2", "Cintas", "Fee Disclosure", "b-url", "the fee clause")
+        self.index.add("c.pdf", "3", "Acme", "Amendment", "c-url", "nothing relevant")
+        hits = self.index.search("fee clause")
+        self.assertEqual([hit['path'] for hit in hits], ["b.pdf", "a.pdf"])
+        self.assertIn("[", hits[0]['snippet'])
+
+    def test_reindex_replaces_document(self):
+        self.index.add("a.pdf", "1", "Geico", "Plan Summary", "a-url", "old text")
+        self.index.add("a.pdf", "2", "Geico", "Plan Summary", "a-url", "new text")
+        self.assertEqual(self.index.search("old"), [])
+        self.assertEqual(len(self.index.search("new")), 1)
+        self.assertEqual(self.index.indexedHashes(), {"a.pdf": "2"})
+        self.index.remove(["a.pdf"])
+        self.assertEqual(self.index.search("new"), [])
+
+    def test_unchanged_files_are_not_extracted_again_without_sha256_column(self):
+        filePath = os.path.join(self.directory.name, "plan.pdf")
+        with open(filePath, 'wb') as pdfFile:
+            pdfFile.write(makePDF("Revenue sharing fee clause"))
+        inputPath = Path(self.directory.name, "TA_ScrapedPDFs.xlsx")
+        pd.DataFrame({'Company': ["Geico"], 'PDF Title': ["Plan"], 'PDF URL': ["a-url"],
+                      'Local FilePath': [f'=HYPERLINK("{filePath}", "CLICK FOR FILE")']}).to_excel(inputPath, sheet_name = 'PDFs', index = False)
+        indexPath = Path(self.directory.name, "workbook_index.sqlite")
+        self.assertEqual(indexWorkbook(inputPath, lambda text, value: None, indexPath), 1)
+        progress = []
+        self.assertEqual(indexWorkbook(inputPath, lambda text, value: progress.append(value), indexPath), 0)
+        self.assertEqual(progress, [])
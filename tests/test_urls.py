@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+from pathlib import Path
+from app.urls import canonicalURL, resourceKey, RedirectCache
+
+class TestCanonicalURL(unittest.TestCase):
+    def test_surface_forms_normalized(self):
+        self.assertEqual(canonicalURL(" HTTPS://Plans.Example.com:443/doc.aspx?b=2&utm_source=mail&a=1#top "),
+                         "https://plans.example.com/doc.aspx?a=1&b=2")
+        self.assertEqual(canonicalURL("https://plans.example.com"), "https://plans.example.com/")
+        self.assertEqual(canonicalURL("http://plans.example.com:8080/x"), "http://plans.example.com:8080/x")
+
+    def test_non_http_values_left_alone(self):
+        self.assertEqual(canonicalURL(" /docs/plan.pdf "), "/docs/plan.pdf")
+        self.assertEqual(canonicalURL("javascript:void(0)"), "javascript:void(0)")
+        self.assertIsNone(canonicalURL(None))
+
+    def test_only_click_ids_and_utm_parameters_dropped(self):
+        self.assertEqual(canonicalURL("https://a.example.com/p?Ref=2&gclid=1&utm_medium=x&referrer=y"),
+                         "https://a.example.com/p?Ref=2&referrer=y")
+
+    def test_resource_key_ignores_scheme(self):
+        self.assertEqual(resourceKey("http://a.example.com/p?x=1"), resourceKey("https://A.example.com/p?x=1&fbclid=9"))
+
+class TestRedirectCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cachePath = Path(self.directory.name) / "redirects.sqlite"
+        self.cache = RedirectCache(self.cachePath)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_redirect_chain_persisted(self):
+        self.cache.record("http://a.example.com/plan?id=1", "https://a.example.com/plan?id=1")
+        self.cache.record("https://a.example.com/plan?id=1", "https://b.example.com/plan/1")
+        self.cache.close()
+        self.cache = RedirectCache(self.cachePath)
+        self.assertEqual(self.cache.resolve("HTTP://a.example.com/plan?id=1"), "https://b.example.com/plan/1")
+
+    def test_resolve_keeps_the_url_as_written(self):
+        self.assertEqual(self.cache.resolve(" https://a.example.com/plan?b=1&id "), "https://a.example.com/plan?b=1&id")
+        self.cache.record("https://a.example.com/plan?id", "https://b.example.com/Plan?id&b=%7E")
+        self.assertEqual(self.cache.resolve("https://A.example.com/plan?id="), "https://b.example.com/Plan?id&b=%7E")
+
+    def test_invalidate(self):
+        self.cache.record("https://a.example.com/x", "https://a.example.com/y")
+        self.cache.invalidate("https://a.example.com/x")
+        self.assertEqual(self.cache.resolve("https://a.example.com/x"), "https://a.example.com/x")
+    def test_retry_after_stale_redirect_follows_the_original_url(self):
+        self.cache.record("https://a.example.com/x", "https://a.example.com/y")
+        fetchURL = self.cache.resolve("https://a.example.com/x")
+        self.assertEqual(self.cache.retryTarget("https://a.example.com/x", fetchURL), "https://a.example.com/x")
+        self.assertEqual(self.cache.resolve("https://a.example.com/x"), "https://a.example.com/x")
+
+if __name__ == '__main__':
+    unittest.main()
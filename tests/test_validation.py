@@ -0,0 +1,81 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from app.validation import validatePDF, countPages, PdfReader
+
+PDF_DATA = (b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+            b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >> endobj\n"
+            b"3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+            b"4 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+            b"trailer << /Root 1 0 R >>\n%%EOF\n")
+
+def objectStreamPDF(pageCount):
+    """
+    Build a PDF 1.5 file whose catalog, page tree and pages are all inside a compressed object stream.
+    """
+    kids = " ".join(f"{3 + page} 0 R" for page in range(pageCount))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {pageCount} >>".encode()]
+    objects += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"] * pageCount
+    offsets, body = [], b""
+    for obj in objects:
+        offsets.append(len(body))
+        body += obj + b" "
+    header = " ".join(f"{number + 1} {offset}" for number, offset in enumerate(offsets)).encode() + b" "
+    stream = zlib.compress(header + body)
+    streamNumber, xrefNumber = len(objects) + 1, len(objects) + 2
+
+    data = b"%PDF-1.5\n"
+    streamOffset = len(data)
+    data += (f"{streamNumber} 0 obj << /Type /ObjStm /N {len(objects)} /First {len(header)} /Filter /FlateDecode /Length {len(stream)} >>\nstream\n".encode()
+             + stream + b"\nendstream\nendobj\n")
+    xrefOffset = len(data)
+    rows = struct.pack(">BIH", 0, 0, 65535) + b"".join(struct.pack(">BIH", 2, streamNumber, number) for number in range(len(objects)))
+    rows = zlib.compress(rows + struct.pack(">BIH", 1, streamOffset, 0) + struct.pack(">BIH", 1, xrefOffset, 0))
+    data += (f"{xrefNumber} 0 obj << /Type /XRef /Size {xrefNumber + 1} /W [1 4 2] /Root 1 0 R /Filter /FlateDecode /Length {len(rows)} >>\nstream\n".encode()
+             + rows + b"\nendstream\nendobj\n" + f"startxref\n{xrefOffset}\n%%EOF\n".encode())
+    return data
+
+class TestValidatePDF(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        filePath = os.path.join(self.directory.name, "test.pdf")
+        with open(filePath, 'wb') as pdfFile:
+            pdfFile.write(data)
+        return filePath
+
+    def test_valid_pdf(self):
+        result = validatePDF(self.write(PDF_DATA), expectedSize = len(PDF_DATA))
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['pages'], 2)
+        self.assertEqual(len(result['sha256']), 64)
+
+    def test_html_error_page(self):
+        result = validatePDF(self.write(b"<html><body>Service Unavailable</body></html>"))
+        self.assertFalse(result['valid'])
+        self.assertIn("%PDF", result['reason'])
+
+    def test_truncated_pdf(self):
+        result = validatePDF(self.write(PDF_DATA[:100]))
+        self.assertFalse(result['valid'])
+        self.assertIn("%%EOF", result['reason'])
+
+    def test_size_mismatch(self):
+        result = validatePDF(self.write(PDF_DATA), expectedSize = len(PDF_DATA) + 10)
+        self.assertFalse(result['valid'])
+
+    def test_missing_file(self):
+        self.assertFalse(validatePDF(os.path.join(self.directory.name, "missing.pdf"))['valid'])
+
+    def test_count_page_objects_without_page_tree_count(self):
+        self.assertEqual(countPages(b"<< /Type /Page >> << /Type /Page >> << /Type /Pages >>"), 2)
+
+    @unittest.skipIf(PdfReader is None, "pypdf is not installed")
+    def test_count_pages_in_compressed_object_stream(self):
+        self.assertEqual(countPages(objectStreamPDF(3)), 3)
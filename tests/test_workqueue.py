@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+import unittest
+from app.workqueue import WorkQueue, LocalWorkQueue, SQLiteWorkQueue, DONE, FAILED
+
+class WorkQueueTests:
+    def makeQueue(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.queue = self.makeQueue()
+        self.queue.put("scrape", [{'url': "a"}, {'url': "b"}])
+
+    def test_lease_hands_out_each_item_once(self):
+        first = self.queue.lease("worker1")
+        second = self.queue.lease("worker2")
+        self.assertNotEqual(first.itemId, second.itemId)
+        self.assertIsNone(self.queue.lease("worker3"))
+
+    def test_complete_records_result(self):
+        item = self.queue.lease("worker1")
+        self.assertTrue(self.queue.complete(item.itemId, "worker1", {'company': "Geico"}))
+        finished = self.queue.finished("scrape")
+        self.assertEqual(len(finished), 1)
+        self.assertEqual(finished[0].status, DONE)
+        self.assertEqual(finished[0].result, {'company': "Geico"})
+
+    def test_expired_lease_is_released_to_another_worker(self):
+        self.queue.clear()
+        self.queue.put("scrape", [{'url': "a"}])
+        item = self.queue.lease("worker1", leaseSeconds = 0)
+        time.sleep(0.01)
+        retried = self.queue.lease("worker2")
+        self.assertEqual(retried.itemId, item.itemId)
+        self.assertEqual(retried.attempts, 2)
+        self.assertFalse(self.queue.complete(item.itemId, "worker1", {}))
+        self.assertTrue(self.queue.complete(item.itemId, "worker2", {}))
+
+    def test_released_item_is_leased_again(self):
+        self.queue.clear()
+        self.queue.put("download", [{'url': "a"}])
+        item = self.queue.lease("worker1")
+        self.assertTrue(self.queue.release(item.itemId, "worker1"))
+        self.assertFalse(self.queue.complete(item.itemId, "worker1", {}))
+        retried = self.queue.lease("worker2")
+        self.assertEqual(retried.itemId, item.itemId)
+        self.assertEqual(retried.attempts, 2)
+
+    def test_item_fails_after_max_attempts(self):
+        self.queue.clear()
+        self.queue.put("scrape", [{'url': "a"}])
+        for attempt in range(3):
+            self.assertIsNotNone(self.queue.lease("worker1", leaseSeconds = 0))
+            time.sleep(0.01)
+        self.assertIsNone(self.queue.lease("worker1"))
+        self.assertTrue(self.queue.isDrained())
+        self.assertEqual(self.queue.finished()[0].status, FAILED)
+
+    def test_runs_are_counted_merged_and_cleared_separately(self):
+        self.queue.clear()
+        self.queue.put("scrape", [{'url': "a"}], runId = "scrapeRun")
+        self.queue.put("download", [{'url': "b"}, {'url': "c"}], runId = "downloadRun")
+        item = self.queue.lease("worker1")
+        self.queue.complete(item.itemId, "worker1", {})
+        self.assertEqual(sum(self.queue.counts("downloadRun").values()), 2)
+        self.assertEqual(len(self.queue.finished(runId = item.runId)), 1)
+        self.queue.clear("downloadRun")
+        self.assertEqual(self.queue.counts("downloadRun"), {})
+        self.assertEqual(sum(self.queue.counts("scrapeRun").values()), 1)
+
+
+class TestWorkQueue(unittest.TestCase):
+    def test_storage_methods_are_abstract(self):
+        with self.assertRaises(TypeError):
+            WorkQueue()
+
+
+class TestLocalWorkQueue(WorkQueueTests, unittest.TestCase):
+    def makeQueue(self):
+        return LocalWorkQueue()
+
+
+class TestSQLiteWorkQueue(WorkQueueTests, unittest.TestCase):
+    def makeQueue(self):
+        self.directory = tempfile.TemporaryDirectory()
+        return SQLiteWorkQueue(os.path.join(self.directory.name, "queue.sqlite"))
+
+    def tearDown(self):
+        self.queue.connect().close()
+        self.directory.cleanup()